@@ -0,0 +1,181 @@
+"""Precomputed dashboard statistics.
+
+``author_stats`` holds one row of running totals per author: posts by status
+(published, pending review) and the views, likes and comments they collected.
+``daily_stats`` holds the same activity per author and UTC day: posts created
+and published, views, likes and comments. Author 0 is the whole site in both
+tables, so a dashboard reads a few small rows instead of aggregating posts.
+
+Changes are added as deltas with one upsert per table. Comments do it in the
+transaction that inserts them (queries.add_comment) and views and likes in
+the counter buffer's flush transaction. Post creation, publication and
+deletion come in through the post signals. Daily rows record activity as it
+happens, so deleting a post takes its numbers off the totals but not off past
+days. ``flask analytics-rebuild`` recomputes the totals and the daily post and
+comment counts; views and likes have no per-day history to rebuild from, so
+their daily numbers are kept.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import bindparam, text
+
+from counters import counters
+from models import db, AuthorStats, DailyStats, Comment, Post
+from signals import post_created, post_published, post_deleted
+
+SITE = 0
+TOTAL_FIELDS = ('published', 'pending', 'views', 'likes', 'comments')
+DAILY_FIELDS = ('posts', 'published', 'views', 'likes', 'comments')
+
+
+def _upsert(table, keys, fields):
+    columns = keys + fields
+    return text(
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(":" + c for c in columns)}) '
+        f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET '
+        + ', '.join(f'{field} = {table}.{field} + excluded.{field}' for field in fields)
+    )
+
+
+_add_totals = _upsert('author_stats', ('author_id',), TOTAL_FIELDS)
+_add_daily = _upsert('daily_stats', ('author_id', 'day'), DAILY_FIELDS).bindparams(bindparam('day', type_=db.Date))
+
+
+def _rows(deltas, fields, **keys):
+    site = Counter()
+    rows = []
+    for author_id, values in deltas.items():
+        site.update(values)
+        rows.append({'author_id': author_id, **keys, **{field: values.get(field, 0) for field in fields}})
+    rows.append({'author_id': SITE, **keys, **{field: site[field] for field in fields}})
+    return rows
+
+
+def apply(conn, totals=None, daily=None, day=None):
+    """Add ``{author_id: {field: delta}}`` to the totals and to ``day``'s row (default today).
+
+    ``conn`` is the caller's connection or session; nothing is committed. The
+    site-wide rows get the sum of the deltas.
+    """
+    if totals:
+        conn.execute(_add_totals, _rows(totals, TOTAL_FIELDS))
+    if daily:
+        conn.execute(_add_daily, _rows(daily, DAILY_FIELDS, day=day or datetime.utcnow().date()))
+
+
+def _record(totals, daily=None, day=None):
+    try:
+        apply(db.session, totals, daily, day)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Analytics update error: {e}")
+
+
+def _status(post):
+    return 'published' if post.is_published else 'pending'
+
+
+def _on_post_created(sender, post, **extra):
+    _record({post.author_id: {_status(post): 1}},
+            {post.author_id: {'posts': 1, 'published': int(bool(post.is_published))}},
+            post.created_at.date())
+
+
+def _on_post_published(sender, post, **extra):
+    _record({post.author_id: {'pending': -1, 'published': 1}}, {post.author_id: {'published': 1}})
+
+
+def _on_post_deleted(sender, post, **extra):
+    _record({post.author_id: {_status(post): -1, 'views': -(post.views or 0), 'likes': -(post.likes or 0),
+                              'comments': -post.comment_count}})
+
+
+def _on_counters_written(conn, batch):
+    authors = dict(conn.execute(db.select(Post.id, Post.author_id).where(Post.id.in_(list(batch)))).all())
+    deltas = defaultdict(Counter)
+    for post_id, values in batch.items():
+        if post_id in authors:
+            deltas[authors[post_id]].update({field: values.get(field, 0) for field in ('views', 'likes')})
+    if deltas:
+        apply(conn, deltas, deltas)
+
+
+def dashboard_stats(author_ids, days=30):
+    """Totals and the last ``days`` of daily activity for each of ``author_ids``.
+
+    Two primary-key range reads, however many posts the authors have.
+    """
+    today = datetime.utcnow().date()
+    first = today - timedelta(days=days - 1)
+    totals = {row.author_id: row for row in AuthorStats.query.filter(AuthorStats.author_id.in_(author_ids))}
+    buckets = defaultdict(dict)
+    for row in DailyStats.query.filter(DailyStats.author_id.in_(author_ids), DailyStats.day >= first):
+        buckets[row.author_id][row.day] = row
+
+    stats = {}
+    for author_id in author_ids:
+        row = totals.get(author_id)
+        values = {field: getattr(row, field) if row else 0 for field in TOTAL_FIELDS}
+        values['total'] = values['published'] + values['pending']
+        series = []
+        for offset in range(days):
+            day = first + timedelta(days=offset)
+            bucket = buckets[author_id].get(day)
+            series.append({'day': day, **{field: getattr(bucket, field) if bucket else 0 for field in DAILY_FIELDS}})
+        values['series'] = series
+        values['peak_views'] = max(point['views'] for point in series)
+        stats[author_id] = values
+    return stats
+
+
+def rebuild(conn):
+    """Recompute the totals and the daily post and comment counts; returns the number of authors."""
+    conn.execute(db.delete(AuthorStats))
+    conn.execute(db.update(DailyStats).values(posts=0, published=0, comments=0))
+
+    day = db.func.date(Post.created_at, type_=db.Date)
+    totals = defaultdict(Counter)
+    daily = defaultdict(lambda: defaultdict(Counter))
+    for row in conn.execute(
+        db.select(Post.author_id, Post.is_published, day.label('day'), db.func.count(),
+                  db.func.coalesce(db.func.sum(Post.views), 0), db.func.coalesce(db.func.sum(Post.likes), 0),
+                  db.func.sum(Post.comment_count))
+        .group_by(Post.author_id, Post.is_published, day)
+    ):
+        author_id, published, created, count, views, likes, comments = row
+        totals[author_id].update({'published' if published else 'pending': count,
+                                  'views': views, 'likes': likes, 'comments': comments})
+        # There is no publication time; published posts count on the day they were created
+        daily[created][author_id].update({'posts': count, 'published': count if published else 0})
+
+    day = db.func.date(Comment.created_at, type_=db.Date)
+    for author_id, commented, count in conn.execute(
+        db.select(Post.author_id, day, db.func.count())
+        .join(Post, Post.id == Comment.post_id)
+        .where(Comment.is_approved == True)
+        .group_by(Post.author_id, day)
+    ):
+        daily[commented][author_id]['comments'] += count
+
+    apply(conn, totals)
+    for created, deltas in daily.items():
+        apply(conn, daily=deltas, day=created)
+    conn.execute(db.delete(DailyStats).where(*[getattr(DailyStats, field) == 0 for field in DAILY_FIELDS]))
+    return len(totals)
+
+
+def init_analytics(app):
+    post_created.connect(_on_post_created, app)
+    post_published.connect(_on_post_published, app)
+    post_deleted.connect(_on_post_deleted, app)
+    counters.on_write(_on_counters_written)
+
+    @app.cli.command('analytics-rebuild')
+    def analytics_rebuild_command():
+        """Recompute the dashboard statistics from the posts and comments."""
+        with db.engine.begin() as conn:
+            count = rebuild(conn)
+        click.echo(f'Rebuilt statistics for {count} authors.')
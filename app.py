@@ -1,21 +1,65 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from datetime import datetime
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import uuid
 
 # Import your models and config
-from models import db, User, Post, Category, Comment, NewsletterSubscription
+from models import db, User, Post, Category, NewsletterSubscription
 from config import Config
+from database import init_database
+from cache import cache, MISSING
+from counters import counters
+from images import pipeline, load_variants, remove_variants
+from mailqueue import mail_queue, enqueue
+from rankings import refresher
+import rankings
+from queries import init_query_budget
+from instrumentation import instrumentation
+from user_cache import user_cache
+from content import init_content
+from http_cache import page_cache
+from assets import assets
+from feeds import init_feeds
+from bulk import init_bulk
+from auth import auth, AuthBusy
+from analytics import init_analytics, dashboard_stats, SITE
+from migrations import init_migrations, upgrade
+from pagination import paginate_keyset, page_args, page_urls
+import queries
+from signals import post_created, post_updated, post_published, post_deleted, user_updated, POST_LISTING_SIGNALS
+from search import init_search, index_post, remove_post, search_posts
 
 app = Flask(__name__)
 app.config.from_object(Config)
+if app.config['PROXY_FIX_X_FOR']:
+    # Client IPs (login throttling) come from X-Forwarded-For set by these trusted proxies
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
 # Initialize extensions
-db.init_app(app)
+init_database(app)
 mail = Mail(app)
+init_search(app)
+counters.init_app(app)
+cache.init_app(app)
+pipeline.init_app(app)
+mail_queue.init_app(app, mail)
+refresher.init_app(app)
+init_query_budget(app)
+instrumentation.init_app(app)
+user_cache.init_app(app)
+init_content(app)
+page_cache.init_app(app)
+assets.init_app(app)
+init_feeds(app)
+init_bulk(app)
+auth.init_app(app)
+init_analytics(app)
+init_migrations(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -23,7 +67,7 @@ login_manager.login_view = 'login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 # File upload configuration
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
@@ -53,7 +97,7 @@ def save_image(file, folder):
         file_path = os.path.join(upload_path, filename)
         
         try:
-            # Save the file directly without processing
+            # Save the original; resized variants are generated off the request thread
             file.save(file_path)
             return filename, None
             
@@ -63,49 +107,201 @@ def save_image(file, folder):
     
     return None, "Invalid file type. Allowed types: PNG, JPG, JPEG, GIF, WEBP."
 
+def delete_image(folder, filename, variants=None):
+    folder_path = os.path.join(app.config['UPLOAD_FOLDER'], folder)
+    file_path = os.path.join(folder_path, filename)
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass  # File might not exist
+    remove_variants(folder_path, load_variants(variants))
+
+def listing_context(page, endpoint, api_endpoint, **values):
+    context = page_urls(endpoint, page, **values)
+    context['next_api_url'] = page_urls(api_endpoint, page, **values)['next_url']
+    return context
+
+def listing_json(page, row_template, api_endpoint, **values):
+    return jsonify({
+        'posts': [{
+            'id': post.id,
+            'title': post.title,
+            'category': post.category.name,
+            'author': post.author.username,
+            'created_at': post.created_at.isoformat(),
+            'views': post.view_count,
+            'likes': post.like_count,
+            'url': url_for('post_detail', post_id=post.id),
+        } for post in page],
+        'html': ''.join(render_template(row_template, post=post) for post in page),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'next_url': page_urls(api_endpoint, page, **values)['next_url'],
+    })
+
+def comments_json(page, post_id, comment_count):
+    return jsonify({
+        'comments': [comment_data(comment) for comment in page],
+        'html': ''.join(render_template('_comment.html', comment=comment) for comment in page),
+        'comment_count': comment_count,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'next_url': page_urls('api_post_comments', page, post_id=post_id)['next_url'],
+    })
+
+def comment_data(comment):
+    return {
+        'id': comment.id,
+        'author': comment.user.username,
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+    }
+
+def comment_page(post_id):
+    return paginate_keyset(queries.post_comments(post_id), queries.COMMENT_KEY,
+                           **page_args(app.config['COMMENTS_PER_PAGE']))
+
+def search_page(query):
+    page = search_posts(query, **page_args())
+    page.items = queries.posts_by_ids([post_id for post_id, _ in page.items])
+    return page
+
+# Homepage cache: query results are cached as post ids and the rendered
+# fragments as HTML, both under the 'homepage' namespace
+def invalidate_homepage(sender, **extra):
+    cache.invalidate('homepage')
+
+for signal in POST_LISTING_SIGNALS:
+    signal.connect(invalidate_homepage, app)
+
+# Conditional GET / anonymous page cache (see http_cache.py); cached post
+# pages still count their views
+page_cache.cacheable('index', page_cache.listings_version)
+page_cache.cacheable('category_posts', lambda category_name: page_cache.listings_version(category_name))
+page_cache.cacheable('post_detail', queries.post_version, on_hit=lambda post_id: counters.incr(post_id, 'views'))
+page_cache.cacheable('about', page_cache.static_version, dynamic=False)
+for endpoint in ('feed_rss', 'feed_atom'):
+    page_cache.cacheable(endpoint, lambda category_name=None: page_cache.listings_version(category_name),
+                         dynamic=False)
+for endpoint in ('sitemap_index', 'sitemap_posts', 'sitemap_pages'):
+    page_cache.cacheable(endpoint, lambda **view_args: page_cache.listings_version(), dynamic=False)
+
+def cached_posts(name, load):
+    key = cache.key('homepage', 'ids', name)
+    ids = cache.get(key)
+    if ids is MISSING:
+        posts = load()
+        cache.set(key, [post.id for post in posts], app.config['HOMEPAGE_CACHE_TTL'])
+        return posts
+    return queries.posts_by_ids(ids)
+
+def cached_category_names():
+    return cache.get_or_set(cache.key('homepage', 'categories'),
+                            lambda: [category.name for category in queries.all_categories()],
+                            app.config['HOMEPAGE_CACHE_TTL'])
+
+def render_fragment(name, template, **loaders):
+    key = cache.key('homepage', 'html', name)
+    html = cache.get(key)
+    if html is MISSING:
+        html = render_template(template, **{arg: load() for arg, load in loaders.items()})
+        cache.set(key, html, app.config['HOMEPAGE_CACHE_TTL'])
+    return Markup(html)
+
 # Routes
 @app.route('/')
 def index():
-    featured_posts = Post.query.filter_by(is_featured=True, is_published=True).order_by(Post.created_at.desc()).limit(3).all()
-    latest_posts = Post.query.filter_by(is_published=True).order_by(Post.created_at.desc()).limit(9).all()
-    trending_posts = Post.query.filter_by(is_published=True).order_by(Post.views.desc()).limit(6).all()
-    categories = Category.query.all()
-    return render_template('index.html', 
-                         featured_posts=featured_posts,
-                         latest_posts=latest_posts,
-                         trending_posts=trending_posts,
-                         categories=categories)
+    fragments = {
+        'hero': render_fragment('hero', '_home_hero.html',
+                                featured_posts=lambda: cached_posts('featured', queries.featured_posts)),
+        'latest': render_fragment('latest', '_home_latest.html',
+                                  latest_posts=lambda: cached_posts('latest', queries.latest_posts)),
+        'trending': render_fragment('trending', '_home_trending.html',
+                                    trending_posts=lambda: cached_posts('trending', queries.trending_posts)),
+        'categories': render_fragment('categories', '_home_categories.html',
+                                      category_names=cached_category_names),
+    }
+    return render_template('index.html', fragments=fragments)
 
 @app.route('/post/<int:post_id>')
 def post_detail(post_id):
-    post = Post.query.get_or_404(post_id)
-    post.views += 1
-    db.session.commit()
-    return render_template('post.html', post=post)
+    post = queries.post_detail(post_id)
+    counters.incr(post.id, 'views')
+    comments = comment_page(post.id)
+    return render_template('post.html', post=post, comments=comments,
+                           related_posts=queries.related_posts(post),
+                           **listing_context(comments, 'post_detail', 'api_post_comments', post_id=post.id))
+
+@app.route('/api/post/<int:post_id>/comments')
+def api_post_comments(post_id):
+    comment_count = db.session.query(Post.comment_count).filter_by(id=post_id).scalar()
+    if comment_count is None:
+        abort(404)
+    return comments_json(comment_page(post_id), post_id, comment_count)
+
+@app.route('/api/post/<int:post_id>/comments', methods=['POST'])
+@login_required
+def api_add_comment(post_id):
+    data = request.get_json(silent=True) or request.form
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({'error': 'Comment cannot be empty.'}), 400
+    added = queries.add_comment(post_id, current_user.id, content)
+    if added is None:
+        abort(404)
+    comment, comment_count = added
+    return jsonify({
+        'comment': comment_data(comment),
+        'html': render_template('_comment.html', comment=comment),
+        'comment_count': comment_count,
+    }), 201
 
 @app.route('/category/<category_name>')
 def category_posts(category_name):
     category = Category.query.filter_by(name=category_name).first_or_404()
-    posts = Post.query.filter_by(category_id=category.id, is_published=True).order_by(Post.created_at.desc()).all()
-    return render_template('index.html', posts=posts, category=category)
+    page = paginate_keyset(queries.category_posts(category.id), queries.LISTING_KEY, **page_args())
+    return render_template('index.html', posts=page, category=category,
+                           **listing_context(page, 'category_posts', 'api_category_posts', category_name=category_name))
+
+@app.route('/api/category/<category_name>')
+def api_category_posts(category_name):
+    category = Category.query.filter_by(name=category_name).first_or_404()
+    page = paginate_keyset(queries.category_posts(category.id), queries.LISTING_KEY, **page_args())
+    return listing_json(page, '_post_card.html', 'api_category_posts', category_name=category_name)
 
 @app.route('/search')
 def search():
     query = request.args.get('q', '')
-    posts = Post.query.filter(
-        Post.title.ilike(f'%{query}%') | 
-        Post.content.ilike(f'%{query}%')
-    ).filter_by(is_published=True).order_by(Post.created_at.desc()).all()
-    return render_template('index.html', posts=posts, search_query=query)
+    page = search_page(query)
+    return render_template('index.html', posts=page, search_query=query,
+                           **listing_context(page, 'search', 'api_search', q=query))
+
+@app.route('/api/search')
+def api_search():
+    query = request.args.get('q', '')
+    return listing_json(search_page(query), '_post_card.html', 'api_search', q=query)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form.get('email')
+        email = request.form.get('email') or ''
         password = request.form.get('password')
+        retry_after = auth.throttled(request.remote_addr, email)
+        if retry_after:
+            flash('Too many login attempts. Please try again later.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(retry_after)}
         user = User.query.filter_by(email=email).first()
+        try:
+            authenticated = auth.authenticate(user, password)
+        except AuthBusy:
+            auth.record_attempt(request.remote_addr)
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
+        auth.record_login(request.remote_addr, email, authenticated)
         
-        if user and user.check_password(password):
+        if authenticated:
+            db.session.commit()  # keeps a rehashed password
             login_user(user)
             flash('Logged in successfully!', 'success')
             next_page = request.args.get('next')
@@ -129,8 +325,16 @@ def register():
             flash('Username already taken', 'error')
             return redirect(url_for('register'))
         
-        user = User(username=username, email=email, role='reader')
-        user.set_password(password)
+        if auth.throttled(request.remote_addr, email or ''):
+            flash('Too many attempts. Please try again later.', 'error')
+            return redirect(url_for('register'))
+        auth.record_attempt(request.remote_addr)
+        try:
+            password_hash = auth.hash_password(password or '')
+        except AuthBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return redirect(url_for('register'))
+        user = User(username=username, email=email, role='reader', password_hash=password_hash)
         db.session.add(user)
         db.session.commit()
         
@@ -148,7 +352,10 @@ def logout():
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
+    user = db.session.get(User, current_user.id)  # current_user is a read-only snapshot
     if request.method == 'POST':
+        new_picture = None
+        
         # Handle profile picture upload
         if 'profile_picture' in request.files:
             file = request.files['profile_picture']
@@ -156,37 +363,65 @@ def profile():
                 filename, error = save_image(file, 'profiles')
                 if filename:
                     # Delete old profile picture if it exists and isn't default
-                    if current_user.profile_picture and current_user.profile_picture != 'default_profile.png':
-                        old_file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'profiles', current_user.profile_picture)
-                        if os.path.exists(old_file_path):
-                            try:
-                                os.remove(old_file_path)
-                            except OSError:
-                                pass  # File might not exist
+                    if user.profile_picture and user.profile_picture != 'default_profile.png':
+                        delete_image('profiles', user.profile_picture, user.profile_picture_variants)
                     
-                    current_user.profile_picture = filename
+                    user.profile_picture = filename
+                    user.profile_picture_variants = None
+                    new_picture = filename
                     flash('Profile picture updated successfully!', 'success')
                 elif error:
                     flash(error, 'error')
         
         # Handle bio update
-        current_user.bio = request.form.get('bio', '')
+        user.bio = request.form.get('bio', '')
         
         db.session.commit()
+        user_updated.send(app, user_id=user.id)
+        if new_picture:
+            pipeline.submit('profiles', user.id, new_picture)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('profile'))
     
-    return render_template('profile.html')
+    return render_template('profile.html', user=user)
 
 @app.route('/dashboard')
 @login_required
 def dashboard():
     if current_user.role in ['author', 'admin']:
-        posts = Post.query.filter_by(author_id=current_user.id).order_by(Post.created_at.desc()).all()
-        return render_template('dashboard.html', posts=posts)
+        page = paginate_keyset(queries.author_posts(current_user.id), queries.LISTING_KEY, **page_args())
+        # Admins also see the site-wide row; both come from the same two summary reads
+        author_ids = [current_user.id, SITE] if current_user.role == 'admin' else [current_user.id]
+        stats = dashboard_stats(author_ids, app.config['DASHBOARD_SERIES_DAYS'])
+        return render_template('dashboard.html', posts=page, stats=stats[current_user.id], site_stats=stats.get(SITE),
+                               **listing_context(page, 'dashboard', 'api_dashboard'))
     flash('You do not have permission to access the dashboard.', 'error')
     return redirect(url_for('index'))
 
+@app.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    if current_user.role not in ['author', 'admin']:
+        return jsonify({'error': 'Forbidden'}), 403
+    page = paginate_keyset(queries.author_posts(current_user.id), queries.LISTING_KEY, **page_args())
+    return listing_json(page, '_dashboard_row.html', 'api_dashboard')
+
+@app.route('/admin/review')
+@login_required
+def review_queue():
+    if current_user.role != 'admin':
+        abort(403)
+    page = paginate_keyset(queries.pending_posts(), queries.LISTING_KEY, **page_args())
+    return render_template('review.html', posts=page, **listing_context(page, 'review_queue', 'api_review_queue'))
+
+@app.route('/api/admin/review')
+@login_required
+def api_review_queue():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Forbidden'}), 403
+    page = paginate_keyset(queries.pending_posts(), queries.LISTING_KEY, **page_args())
+    return listing_json(page, '_review_row.html', 'api_review_queue')
+
 @app.route('/create-post', methods=['GET', 'POST'])
 @login_required
 def create_post():
@@ -214,15 +449,20 @@ def create_post():
         
         post = Post(
             title=title,
-            content=content,
             featured_image=featured_image,
             author_id=current_user.id,
             category_id=category_id,
             is_featured=is_featured,
             is_published=current_user.role == 'admin'  # Auto-publish for admins
         )
+        post.set_content(content)
         db.session.add(post)
+        db.session.flush()
+        index_post(post)
         db.session.commit()
+        if featured_image:
+            pipeline.submit('posts', post.id, featured_image)
+        post_created.send(app, post=post)
         
         if current_user.role == 'admin':
             flash('Post published successfully!', 'success')
@@ -246,10 +486,11 @@ def edit_post(post_id):
     
     if request.method == 'POST':
         post.title = request.form.get('title')
-        post.content = request.form.get('content')
+        post.set_content(request.form.get('content'))
         post.category_id = request.form.get('category_id')
         post.is_featured = bool(request.form.get('is_featured'))
         post.updated_at = datetime.utcnow()
+        new_image = None
         
         # Handle featured image upload
         if 'featured_image' in request.files:
@@ -259,19 +500,20 @@ def edit_post(post_id):
                 if filename:
                     # Delete old featured image if it exists
                     if post.featured_image:
-                        old_file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'posts', post.featured_image)
-                        if os.path.exists(old_file_path):
-                            try:
-                                os.remove(old_file_path)
-                            except OSError:
-                                pass  # File might not exist
+                        delete_image('posts', post.featured_image, post.image_variants)
                     
                     post.featured_image = filename
+                    post.image_variants = None
+                    new_image = filename
                     flash('Featured image updated successfully!', 'success')
                 elif error:
                     flash(error, 'error')
         
+        index_post(post)
         db.session.commit()
+        if new_image:
+            pipeline.submit('posts', post.id, new_image)
+        post_updated.send(app, post=post)
         flash('Post updated successfully!', 'success')
         return redirect(url_for('dashboard'))
     
@@ -288,17 +530,16 @@ def delete_post(post_id):
         flash('You do not have permission to delete this post.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Delete featured image if it exists
+    # Delete featured image and its variants if they exist
     if post.featured_image:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'posts', post.featured_image)
-        if os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass  # File might not exist
+        delete_image('posts', post.featured_image, post.image_variants)
     
+    remove_post(post.id)
+    rankings.remove_post(post.id)
+    counters.discard(post.id)
     db.session.delete(post)
     db.session.commit()
+    post_deleted.send(app, post=post)
     flash('Post deleted successfully!', 'success')
     return redirect(url_for('dashboard'))
 
@@ -310,11 +551,34 @@ def publish_post(post_id):
         return redirect(url_for('dashboard'))
     
     post = Post.query.get_or_404(post_id)
-    post.is_published = True
-    db.session.commit()
-    flash('Post published successfully!', 'success')
+    if post.is_published:
+        flash('Post is already published.', 'info')
+    else:
+        post.is_published = True
+        index_post(post)
+        db.session.commit()
+        post_published.send(app, post=post)
+        flash('Post published successfully!', 'success')
+    if request.form.get('next') == 'review':
+        return redirect(url_for('review_queue'))
     return redirect(url_for('dashboard'))
 
+@app.route('/admin/cache-stats')
+@login_required
+def cache_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    return jsonify(cache.info())
+
+@app.route('/admin/instrumentation', methods=['GET', 'POST'])
+@login_required
+def instrumentation_stats():
+    if current_user.role != 'admin':
+        abort(403)
+    if request.method == 'POST':
+        instrumentation.reset()
+    return jsonify(instrumentation.snapshot())
+
 @app.route('/about')
 def about():
     return render_template('about.html')
@@ -326,17 +590,19 @@ def contact():
         email = request.form.get('email')
         message = request.form.get('message')
         
-        # Send email to admin
+        # Queue email to admin; the mail queue workers deliver it
         try:
-            msg = Message(
+            enqueue(
+                app.config['ADMIN_EMAIL'],
                 subject=f'Contact Form Message from {name}',
+                body=f"Name: {name}\nEmail: {email}\nMessage: {message}",
                 sender=app.config['MAIL_DEFAULT_SENDER'],
-                recipients=[app.config['ADMIN_EMAIL']],
-                body=f"Name: {name}\nEmail: {email}\nMessage: {message}"
             )
-            mail.send(msg)
+            db.session.commit()
+            mail_queue.wake()
             flash('Message sent successfully!', 'success')
         except Exception as e:
+            db.session.rollback()
             print(f"Email error: {e}")
             flash('Failed to send message. Please try again later.', 'error')
         
@@ -360,18 +626,16 @@ def newsletter_subscribe():
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
-    post.likes += 1
-    db.session.commit()
-    return jsonify({'likes': post.likes})
+    counters.incr(post.id, 'likes')
+    return jsonify({'likes': post.like_count})
 
 @app.route('/comment/<int:post_id>', methods=['POST'])
 @login_required
 def add_comment(post_id):
-    content = request.form.get('content')
+    content = (request.form.get('content') or '').strip()
     if content:
-        comment = Comment(content=content, user_id=current_user.id, post_id=post_id)
-        db.session.add(comment)
-        db.session.commit()
+        if queries.add_comment(post_id, current_user.id, content) is None:
+            abort(404)
         flash('Comment added successfully!', 'success')
     else:
         flash('Comment cannot be empty.', 'error')
@@ -399,7 +663,7 @@ if __name__ == '__main__':
         except Exception as e:
             print(f"Warning: Could not create upload directories: {e}")
         
-        db.create_all()
+        upgrade()
         # Create default categories
         if not Category.query.first():
             categories = ['Technology', 'Business', 'Lifestyle', 'Entertainment', 'Sports', 'Health', 'Politics']
@@ -420,4 +684,4 @@ if __name__ == '__main__':
         print("Application started successfully!")
         print("Access the site at: http://localhost:5000")
     
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true'))
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""Fingerprinted, pre-compressed CSS and JS bundles.
+
+The files listed in BUNDLES are concatenated, minified and written to
+static/dist with a content hash in the name, next to .gz (and, when the
+``brotli`` package is installed, .br) siblings. static/dist/manifest.json maps
+each bundle name to its current file; templates link bundles through
+``asset_url()``. /static/dist/ responses pick the precompressed sibling that
+matches Accept-Encoding and are marked immutable, since a content change
+produces a new file name.
+
+Bundles are rebuilt at startup when a source is newer than the manifest (and
+on every lookup in debug mode); ``flask assets-build`` rebuilds them
+explicitly.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+
+import click
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip siblings are written
+    brotli = None
+
+BUNDLES = {
+    'css/site.css': ['css/style.css', 'css/dark-mode.css'],
+    'js/site.js': ['js/main.js', 'js/dark-mode.js', 'js/animations.js'],
+}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_css_comment_re = re.compile(r'/\*.*?\*/', re.DOTALL)
+_css_space_re = re.compile(r'\s+')
+_css_punctuation_re = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(source):
+    source = _css_comment_re.sub('', source)
+    source = _css_space_re.sub(' ', source)
+    source = _css_punctuation_re.sub(r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    # Conservative: drop comment-only lines and indentation, never touch code or template literals
+    lines = []
+    in_template = False
+    in_comment = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_template:
+            lines.append(line)
+        elif in_comment:
+            in_comment = '*/' not in stripped
+            continue
+        elif stripped.startswith('/*'):
+            in_comment = '*/' not in stripped
+            continue
+        elif stripped and not stripped.startswith('//'):
+            lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Assets:
+    def __init__(self):
+        self._app = None
+        self.manifest = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.source_folder = app.static_folder
+        self.dist_folder = os.path.join(app.static_folder, 'dist')
+        self.manifest_path = os.path.join(self.dist_folder, 'manifest.json')
+        self.manifest = self._read_manifest()
+        if app.config.get('ASSETS_BUILD_ON_STARTUP', True) and self.stale():
+            self.build()
+
+        app.add_url_rule('/static/dist/<path:filename>', 'assets', self.send)
+        app.jinja_env.globals['asset_url'] = self.url
+
+        @app.cli.command('assets-build')
+        def assets_build_command():
+            """Minify, fingerprint and precompress the CSS and JS bundles."""
+            for name, path in self.build().items():
+                click.echo(f'{name} -> dist/{path}')
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def stale(self):
+        if set(self.manifest) != set(BUNDLES):
+            return True
+        built = os.path.getmtime(self.manifest_path)
+        return any(os.path.getmtime(os.path.join(self.source_folder, source)) > built
+                   for sources in BUNDLES.values() for source in sources
+                   if os.path.exists(os.path.join(self.source_folder, source)))
+
+    def build(self):
+        with self._lock:
+            previous = dict(self.manifest)
+            manifest = {}
+            for name, sources in BUNDLES.items():
+                base, ext = os.path.splitext(name)
+                parts = []
+                for source in sources:
+                    path = os.path.join(self.source_folder, source)
+                    if os.path.exists(path):
+                        with open(path, encoding='utf-8') as f:
+                            parts.append(MINIFIERS[ext](f.read()))
+                data = ('\n;\n' if ext == '.js' else '\n').join(part for part in parts if part).encode('utf-8')
+                filename = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+                path = os.path.join(self.dist_folder, filename)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _write(path, data)
+                _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+                if brotli is not None:
+                    _write(path + '.br', brotli.compress(data))
+                manifest[name] = filename
+            os.makedirs(self.dist_folder, exist_ok=True)
+            _write(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+            self.manifest = manifest
+            self._prune(set(manifest.values()) | set(previous.values()))
+            return manifest
+
+    def _prune(self, keep):
+        # Keep the previous build too, for pages rendered before this one
+        for directory, _, files in os.walk(self.dist_folder):
+            for name in files:
+                relative = os.path.relpath(os.path.join(directory, name), self.dist_folder).replace(os.sep, '/')
+                if relative == 'manifest.json' or '.tmp' in name or re.sub(r'\.(gz|br)$', '', relative) in keep:
+                    continue
+                os.remove(os.path.join(directory, name))
+
+    def url(self, name):
+        if name not in self.manifest or (self._app.debug and self.stale()):
+            self.build()
+        return url_for('assets', filename=self.manifest[name])
+
+    def send(self, filename):
+        mimetype = mimetypes.guess_type(filename)[0]
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.exists(os.path.join(self.dist_folder, filename + suffix)):
+                response = send_from_directory(self.dist_folder, filename + suffix, mimetype=mimetype,
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist_folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
@@ -0,0 +1,204 @@
+"""Password hashing off the request path, and login throttling.
+
+Hashing and verifying passwords is deliberately slow, so a burst of logins
+would otherwise keep every worker busy in PBKDF2 and leave nothing for page
+rendering. ``auth`` runs that work in a small process pool whose processes
+are niced below the web workers. They are forked by ``init_app``, before the
+app starts any background threads. Running gunicorn with ``--preload`` would
+share one pool between all its workers, so don't. At most AUTH_HASH_WORKERS + AUTH_HASH_QUEUE
+hash jobs are admitted at once; beyond that, or when a job takes longer than
+AUTH_HASH_TIMEOUT, ``AuthBusy`` is raised and the view answers 503 instead of
+queueing more CPU work. AUTH_HASH_WORKERS = 0 hashes in the request thread,
+still bounded by the same admission limit.
+
+Login attempts are throttled before any hashing with in-memory sliding
+windows: failed logins count against the client IP and the email address,
+and a successful login clears the address. Registrations hash on every
+attempt, and logins refused with ``AuthBusy`` were stopped before they
+could hash; both always count against the IP, so a flood that keeps the
+pool saturated is still throttled with 429s. Windows are kept per
+process, least recently used keys are evicted past AUTH_THROTTLE_MAX_KEYS.
+
+The client IP is ``request.remote_addr``. Behind a reverse proxy that is the
+proxy's address, so every client would share one window. Set PROXY_FIX_X_FOR
+to the number of proxies in front of the app; app.py then wraps it in
+werkzeug's ProxyFix, which takes the client from X-Forwarded-For. Leave it
+at 0 when clients connect directly, or the header lets them pick any IP.
+
+A successful login whose stored hash was made with another method or cost
+than PASSWORD_HASH_METHOD is rehashed with the current one.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class AuthBusy(Exception):
+    """The hashing pool is saturated; the client should retry shortly."""
+
+
+def _lower_priority(niceness):
+    if niceness:
+        os.nice(niceness)
+
+
+class SlidingWindow:
+    """At most ``limit`` hits per key in any ``window`` seconds."""
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        hits = self._hits.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._hits[key]
+            return None
+        return hits
+
+    def retry_after(self, key, now=None):
+        """Seconds until ``key`` may hit again (0 when it may now)."""
+        now = now or time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is None or len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now + 1))
+
+    def hit(self, key, now=None):
+        now = now or time.monotonic()
+        with self._lock:
+            hits = self._recent(key, now)
+            if hits is None:
+                hits = self._hits[key] = deque()
+            hits.append(now)
+            self._hits.move_to_end(key)
+            while len(self._hits) > self.max_keys:
+                self._hits.popitem(last=False)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def __len__(self):
+        return len(self._hits)
+
+
+class Auth:
+    def __init__(self):
+        self._executor = None
+        self._dummy_hash = None
+        self.throttling = False
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        self.workers = app.config.get('AUTH_HASH_WORKERS', 2)
+        self.timeout = app.config.get('AUTH_HASH_TIMEOUT', 5)
+        self.niceness = app.config.get('AUTH_HASH_NICE', 10)
+        self._slots = threading.BoundedSemaphore(max(1, self.workers) + app.config.get('AUTH_HASH_QUEUE', 8))
+
+        self.throttling = app.config.get('AUTH_THROTTLE_ENABLED', True)
+        window = app.config.get('AUTH_THROTTLE_WINDOW', 300)
+        max_keys = app.config.get('AUTH_THROTTLE_MAX_KEYS', 100000)
+        self.ip_window = SlidingWindow(app.config.get('AUTH_THROTTLE_IP_LIMIT', 30), window, max_keys)
+        self.email_window = SlidingWindow(app.config.get('AUTH_THROTTLE_EMAIL_LIMIT', 5), window, max_keys)
+        if self.workers and self._executor is None:
+            self._start_pool()
+
+    def _start_pool(self):
+        # fork: spawned workers would re-run the main script; these only call werkzeug.security.
+        # The workers are forked here, while the app is still single-threaded: forked later,
+        # they could inherit locks held by the mail, counter or ranking threads.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('fork'),
+            initializer=_lower_priority, initargs=(self.niceness,))
+        # A fork-context pool starts all of its workers on the first submit
+        self._executor.submit(_lower_priority, 0).result()
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusy()
+        if not self.workers:
+            try:
+                return func(*args)
+            finally:
+                self._slots.release()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise AuthBusy()
+
+    def hash_password(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def _dummy(self):
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash_password(os.urandom(16).hex())
+        return self._dummy_hash
+
+    def check_password(self, pwhash, password):
+        # Unknown users are checked against a dummy hash so both cases take as long
+        return self._run(check_password_hash, pwhash or self._dummy(), password)
+
+    def needs_rehash(self, pwhash):
+        # Werkzeug hashes are "method$salt$hash", the method part spelled out with its cost
+        # (e.g. "pbkdf2:sha256:600000"); the dummy hash shows how the current method spells it
+        return bool(pwhash) and pwhash.split('$', 1)[0] != self._dummy().split('$', 1)[0]
+
+    def authenticate(self, user, password):
+        """Verify ``password`` for ``user`` (may be None), upgrading an outdated hash.
+
+        The caller commits the session when the user's hash was replaced.
+        """
+        if not self.check_password(user.password_hash if user else None, password or ''):
+            return False
+        if self.needs_rehash(user.password_hash):
+            user.password_hash = self.hash_password(password)
+        return True
+
+    def throttled(self, ip, email):
+        """Seconds to wait when ``ip`` or ``email`` is over its limit, else 0; counts nothing."""
+        if not self.throttling:
+            return 0
+        return max(self.ip_window.retry_after(f'ip:{ip}'),
+                   self.email_window.retry_after(f'email:{email.lower()}'))
+
+    def record_login(self, ip, email, succeeded):
+        if not self.throttling:
+            return
+        if succeeded:
+            self.email_window.reset(f'email:{email.lower()}')
+        else:
+            self.ip_window.hit(f'ip:{ip}')
+            self.email_window.hit(f'email:{email.lower()}')
+
+    def record_attempt(self, ip):
+        # Registrations cost a hash each, and logins refused with AuthBusy would have;
+        # both count against the IP so a flood that keeps the pool saturated is throttled
+        if self.throttling:
+            self.ip_window.hit(f'ip:{ip}')
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+auth = Auth()
@@ -0,0 +1,133 @@
+"""Post page latency while the login form is flooded with bad passwords.
+
+Usage: python benchmarks/bench_auth.py [--seconds 10] [--readers 2] [--flooders 8]
+
+Reader threads fetch post pages (page cache off, so every request renders)
+while flooder threads POST wrong passwords to /login. Each mode runs in its
+own process against a fresh SQLite database, since the auth settings are
+read at import time:
+
+  quiet      no flood, for reference
+  inline     hashing in the request threads, unbounded (AUTH_HASH_WORKERS=0)
+  pool       hashing in the niced process pool with a short admission queue
+  throttled  pool plus the per-IP/per-email sliding windows
+
+The flooders run in the same process as the readers and send requests back
+to back, so even cheap 429 answers keep competing with page rendering for
+the CPU. Once throttled, a flood costs what serving that many small
+responses costs, not what hashing would.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'quiet': {'AUTH_THROTTLE_ENABLED': 'false'},
+    'inline': {'AUTH_HASH_WORKERS': '0', 'AUTH_HASH_QUEUE': '1000', 'AUTH_THROTTLE_ENABLED': 'false'},
+    'pool': {'AUTH_HASH_WORKERS': '1', 'AUTH_HASH_QUEUE': '2', 'AUTH_THROTTLE_ENABLED': 'false'},
+    'throttled': {'AUTH_HASH_WORKERS': '1', 'AUTH_HASH_QUEUE': '2', 'AUTH_THROTTLE_ENABLED': 'true'},
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_mode(mode, seconds, readers, flooders):
+    sys.path.insert(0, ROOT)
+    from app import app
+    from http_cache import page_cache
+    from models import db, User, Post, Category
+
+    page_cache.enabled = False
+    with app.app_context():
+        db.create_all()
+        author = User(username='bench', email='bench@example.com', role='admin')
+        author.set_password('bench')
+        category = Category(name='Technology')
+        db.session.add_all([author, category])
+        db.session.flush()
+        for i in range(20):
+            post = Post(title=f'Post {i}', author_id=author.id, category_id=category.id, is_published=True)
+            post.set_content('Lorem ipsum dolor sit amet. ' * 200)
+            db.session.add(post)
+        db.session.commit()
+
+    stop = threading.Event()
+    latencies = []
+    logins = Counter()
+    lock = threading.Lock()
+
+    def reader(offset):
+        client = app.test_client()
+        n = offset
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.get(f'/post/{n % 20 + 1}')
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed if response.status_code == 200 else float('inf'))
+            n += 1
+
+    def flooder(offset):
+        client = app.test_client()
+        n = 0
+        while not stop.is_set():
+            response = client.post('/login', data={'email': f'victim{(offset + n) % 50}@example.com',
+                                                   'password': 'wrong'})
+            with lock:
+                logins[response.status_code] += 1
+            n += 1
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    if mode != 'quiet':
+        threads += [threading.Thread(target=flooder, args=(n,)) for n in range(flooders)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    attempts = ' '.join(f'{status}:{count}' for status, count in sorted(logins.items())) or '-'
+    print(f'{len(latencies) / seconds:7.1f} pages/s  p50 {percentile(latencies, 0.5):7.1f} ms  '
+          f'p95 {percentile(latencies, 0.95):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  '
+          f'logins {attempts}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--flooders', type=int, default=8)
+    parser.add_argument('--mode', choices=list(MODES))
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.seconds, args.readers, args.flooders)
+        return
+
+    for mode, settings in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+                       ASSETS_BUILD_ON_STARTUP='false', **settings)
+            result = subprocess.run(
+                [sys.executable, __file__, '--mode', mode, '--seconds', str(args.seconds),
+                 '--readers', str(args.readers), '--flooders', str(args.flooders)],
+                env=env, capture_output=True, text=True)
+            output = result.stdout.strip().splitlines() or result.stderr.strip().splitlines()[-1:]
+            print(f'{mode:>9}: {output[-1] if output else "no output"}')
+
+
+if __name__ == '__main__':
+    main()
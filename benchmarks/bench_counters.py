@@ -0,0 +1,90 @@
+"""Post page throughput with and without write-behind view counters.
+
+Usage: python benchmarks/bench_counters.py [--requests 2000] [--threads 8]
+
+Each mode runs in its own process against a fresh SQLite database so the
+buffering setting is read at import time like in production.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_mode(total_requests, threads):
+    sys.path.insert(0, ROOT)
+    from app import app
+    from counters import counters
+    from http_cache import page_cache
+    from models import db, User, Post, Category
+
+    page_cache.enabled = False  # every request has to reach the view and count a view
+
+    with app.app_context():
+        db.create_all()
+        author = User(username='bench', email='bench@example.com', role='admin')
+        author.set_password('bench')
+        category = Category(name='Technology')
+        db.session.add_all([author, category])
+        db.session.flush()
+        for i in range(20):
+            post = Post(title=f'Post {i}', author_id=author.id, category_id=category.id, is_published=True)
+            post.set_content('Lorem ipsum ' * 200)
+            db.session.add(post)
+        db.session.commit()
+
+    per_thread = total_requests // threads
+    errors = []
+
+    def worker(offset):
+        client = app.test_client()
+        for i in range(per_thread):
+            response = client.get(f'/post/{(offset + i) % 20 + 1}')
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    counters.flush()
+
+    with app.app_context():
+        stored = db.session.query(db.func.sum(Post.views)).scalar()
+    print(f'{per_thread * threads / elapsed:.1f} req/s, {stored} views stored, {len(errors)} errors')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--mode', choices=['buffered', 'direct'])
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.requests, args.threads)
+        return
+
+    for mode in ('direct', 'buffered'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+                       COUNTER_BUFFERING='true' if mode == 'buffered' else 'false')
+            result = subprocess.run(
+                [sys.executable, __file__, '--mode', mode,
+                 '--requests', str(args.requests), '--threads', str(args.threads)],
+                env=env, capture_output=True, text=True)
+            output = result.stdout.strip().splitlines() or result.stderr.strip().splitlines()[-1:]
+            print(f'{mode:>8}: {output[-1] if output else "no output"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Throughput under concurrent reads and writes for each database setup.
+
+Usage: python benchmarks/bench_database.py [--requests 4000] [--threads 8]
+           [--mix index=20,post_detail=40,...] [--posts 2000] [--comments 20000]
+
+One database is seeded, then each mode runs loadtest.py in its own process
+against a fresh copy of it:
+
+  default   SQLite defaults: rollback journal, no pragmas (SQLITE_TUNING=false)
+  tuned     SQLITE_PRAGMAS applied on connect (WAL, synchronous=NORMAL, ...)
+  replica   tuned, plus a second SQLite file as DATABASE_REPLICA_URL, so GET
+            requests read from the copy and writes go to the primary
+
+The replica is a snapshot taken before the run; nothing replicates writes
+to it, which is fine for throughput but means reads lag behind.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOADTEST = os.path.join(ROOT, 'benchmarks', 'loadtest.py')
+SEED = os.path.join(ROOT, 'benchmarks', 'seed.py')
+
+DEFAULT_MIX = 'index=20,post_detail=40,category_posts=10,search=5,like_post=5,add_comment=20'
+MODES = ('default', 'tuned', 'replica')
+
+
+def copy_database(source, target, journal_mode):
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    src.backup(dst)
+    dst.execute(f'PRAGMA journal_mode={journal_mode}')
+    src.close()
+    dst.close()
+
+
+def run_mode(mode, seeded, tmp, args):
+    primary = os.path.join(tmp, f'{mode}.db')
+    copy_database(seeded, primary, 'DELETE' if mode == 'default' else 'WAL')
+    env = dict(os.environ, SQLITE_TUNING='false' if mode == 'default' else 'true',
+               ASSETS_BUILD_ON_STARTUP='false')
+    env.pop('DATABASE_REPLICA_URL', None)
+    if mode == 'replica':
+        replica = os.path.join(tmp, f'{mode}-replica.db')
+        copy_database(seeded, replica, 'WAL')
+        env['DATABASE_REPLICA_URL'] = 'sqlite:///' + replica
+    output = os.path.join(tmp, f'{mode}.json')
+    result = subprocess.run(
+        [sys.executable, LOADTEST, '--database', primary, '--requests', str(args.requests),
+         '--threads', str(args.threads), '--mix', args.mix, '--output', output],
+        env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f'{mode} failed:\n{result.stderr}')
+    with open(output) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--mode', choices=MODES, action='append', help='Run only these modes.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, 'seed.db')
+        subprocess.run([sys.executable, SEED, '--users', str(args.users), '--posts', str(args.posts),
+                        '--comments', str(args.comments), '--batch-size', '2000'],
+                       env=dict(os.environ, DATABASE_URL='sqlite:///' + seeded, SQLITE_TUNING='false',
+                                ASSETS_BUILD_ON_STARTUP='false'),
+                       check=True, capture_output=True)
+
+        print(f"{'mode':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+              f"{'write p95':>11}")
+        for mode in args.mode or MODES:
+            result = run_mode(mode, seeded, tmp, args)
+            writes = result['endpoints'].get('add_comment') or {}
+            print(f"{mode:<10}{result['requests_per_s']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                  f"{result['p99_ms']:>9.1f}{result['errors']:>8}{writes.get('p95_ms') or 0:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
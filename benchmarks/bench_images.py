@@ -0,0 +1,70 @@
+"""Bytes per page with original uploads versus pipeline variants.
+
+Usage: python benchmarks/bench_images.py [--width 3000] [--height 2000]
+
+Generates a synthetic photo-like JPEG upload, runs it through the image
+pipeline and compares what each page downloads for its image slots.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageFilter  # noqa: E402
+
+from images import process_image, closest_variant  # noqa: E402
+
+# Image slots per page: (rendered width in CSS pixels, count)
+PAGES = {
+    'index': [(800, 1), (400, 9)],
+    'post_detail': [(1200, 1), (400, 3)],
+    'category_posts': [(400, 12)],
+    'dashboard': [(96, 12)],
+}
+
+
+def synthetic_photo(path, width, height):
+    noise = Image.effect_noise((width, height), 64).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    Image.blend(noise, gradient, 0.6).filter(ImageFilter.GaussianBlur(1)).save(path, 'JPEG', quality=92)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        original = os.path.join(tmp, 'upload.jpg')
+        synthetic_photo(original, args.width, args.height)
+        original_bytes = os.path.getsize(original)
+
+        start = time.perf_counter()
+        variants = process_image(original, 'posts')
+        elapsed = time.perf_counter() - start
+        print(f'original {args.width}x{args.height}: {original_bytes / 1024:.0f} KiB, '
+              f'processed in {elapsed * 1000:.0f} ms')
+        for fmt, names in variants.items():
+            sizes = ', '.join(f'{w}w={os.path.getsize(os.path.join(tmp, n)) / 1024:.1f} KiB'
+                              for w, n in sorted(names.items(), key=lambda item: int(item[0])))
+            print(f'  {fmt}: {sizes}')
+
+        print(f'\n{"page":<16}{"original KiB":>14}{"variants KiB":>14}{"saved":>10}')
+        for page, slots in PAGES.items():
+            before = sum(count * original_bytes for _, count in slots)
+            after = sum(count * os.path.getsize(os.path.join(tmp, closest_variant(variants, width)))
+                        for width, count in slots)
+            print(f'{page:<16}{before / 1024:>14.0f}{after / 1024:>14.0f}{100 * (1 - after / before):>9.1f}%')
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
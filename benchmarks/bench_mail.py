@@ -0,0 +1,95 @@
+"""Mail queue throughput against a local SMTP stand-in.
+
+Usage: python benchmarks/bench_mail.py [--messages 2000] [--batch-size 50]
+
+Starts a minimal in-process SMTP sink, queues a newsletter for N subscribers
+through the streaming enqueue path and drains the queue, reporting
+messages/second. The same commands work against any local stand-in such as
+``python -m aiosmtpd -n -l localhost:1025``.
+"""
+import argparse
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.received += 1
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    received = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    sink = SMTPSink(('127.0.0.1', 0), SMTPSinkHandler)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL='sqlite:///' + os.path.join(tmp, 'bench.db'),
+                      MAIL_SERVER='127.0.0.1', MAIL_PORT=str(sink.server_address[1]),
+                      MAIL_USE_TLS='false', MAIL_QUEUE_WORKERS='0')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from mailqueue import mail_queue
+    from models import db, NewsletterSubscription
+
+    app.config['MAIL_QUEUE_BATCH_SIZE'] = mail_queue.batch_size = args.batch_size
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(NewsletterSubscription),
+                           [{'email': f'reader{i}@example.com', 'is_active': True} for i in range(args.messages)])
+        db.session.commit()
+
+    body_path = os.path.join(tmp, 'newsletter.txt')
+    with open(body_path, 'w') as body:
+        body.write('This week on The Daily Pulse...\n')
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['newsletter-send', '--subject', 'Weekly digest', '--body-file', body_path])
+    print(result.output.strip())
+
+    start = time.perf_counter()
+    result = runner.invoke(args=['mail-drain'])
+    elapsed = time.perf_counter() - start
+    print(result.output.strip() or result.exception)
+    print(f'SMTP sink received {sink.received} messages ({sink.received / elapsed:.1f} msg/s end to end)')
+    sink.shutdown()
+
+
+if __name__ == '__main__':
+    main()
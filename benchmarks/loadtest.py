@@ -0,0 +1,299 @@
+"""Load test over a realistic traffic mix, saved as JSON for comparison.
+
+Usage: python benchmarks/loadtest.py [--database /tmp/bench.db] [--requests 5000]
+           [--threads 8] [--mix index=25,post_detail=40,...] [--server] [--output FILE]
+
+Without --database a small database is seeded into a temporary directory
+(see seed.py for large volumes). Requests go through the Flask test client,
+or with --server through a local threaded WSGI server over HTTP. Reports
+p50/p95/p99 latency, requests/second and SQL statements per request for each
+endpoint; results are written to benchmarks/results/ unless --output is given.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+DEFAULT_MIX = 'index=25,post_detail=40,category_posts=10,search=10,like_post=10,add_comment=5'
+SQL_HEADER = 'X-Bench-SQL-Statements'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'index', 'post_detail', 'category_posts', 'search', 'like_post', 'add_comment'}
+    if unknown:
+        raise SystemExit(f'Unknown endpoints in --mix: {", ".join(sorted(unknown))}')
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def instrument(app, engines):
+    # Count statements per request in the request's own thread and report them in a header
+    from sqlalchemy import event
+
+    local = threading.local()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if getattr(local, 'active', False):
+            local.count += 1
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+
+    @app.before_request
+    def start_sql_count():
+        local.active = True
+        local.count = 0
+
+    @app.after_request
+    def report_sql_count(response):
+        response.headers[SQL_HEADER] = str(local.count)
+        local.active = False
+        return response
+
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get(SQL_HEADER)
+
+
+class HTTPTransport:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookie = None
+
+    def request(self, method, path, data=None):
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, response.getheader(SQL_HEADER)
+        finally:
+            conn.close()
+
+
+class Workload:
+    def __init__(self, post_ids, category_names, search_terms, mix, rng):
+        self.post_ids = post_ids
+        self.category_names = category_names
+        self.search_terms = search_terms
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.rng = rng
+
+    def popular_post(self):
+        # Skewed towards the newest posts, like front-page traffic
+        return self.post_ids[min(int(self.rng.paretovariate(1.1)) - 1, len(self.post_ids) - 1)]
+
+    def next_request(self):
+        endpoint = self.rng.choices(self.endpoints, self.weights)[0]
+        if endpoint == 'index':
+            return endpoint, 'GET', '/', None
+        if endpoint == 'post_detail':
+            return endpoint, 'GET', f'/post/{self.popular_post()}', None
+        if endpoint == 'category_posts':
+            return endpoint, 'GET', f'/category/{self.rng.choice(self.category_names)}', None
+        if endpoint == 'search':
+            return endpoint, 'GET', '/search?' + urlencode({'q': self.rng.choice(self.search_terms)}), None
+        if endpoint == 'like_post':
+            return endpoint, 'POST', f'/like-post/{self.popular_post()}', None
+        return endpoint, 'POST', f'/comment/{self.popular_post()}', {'content': 'Benchmark comment'}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args, mix):
+    sys.path.insert(0, ROOT)
+    from app import app
+    from counters import counters
+    from models import db, User, Post, Category, Comment
+    from seed import WORDS, PASSWORD
+
+    with app.app_context():
+        instrument(app, set(db.engines.values()))
+        post_ids = [post_id for post_id, in db.session.execute(
+            db.select(Post.id).where(Post.is_published == True).order_by(Post.created_at.desc()))]
+        category_names = [name for name, in db.session.execute(db.select(Category.name))]
+        reader_emails = [email for email, in db.session.execute(
+            db.select(User.email).where(User.email.like('bench%@example.com')).limit(args.threads))]
+        volumes = {'users': User.query.count(), 'posts': Post.query.count(), 'comments': Comment.query.count()}
+    if not post_ids or not reader_emails:
+        raise SystemExit('The database has no seeded posts or users; run benchmarks/seed.py first.')
+
+    server = None
+    if args.server:
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def transport():
+        if server is not None:
+            return HTTPTransport('127.0.0.1', server.server_port)
+        return TestClientTransport(app)
+
+    samples = []
+    samples_lock = threading.Lock()
+    per_thread = args.requests // args.threads
+
+    def worker(number):
+        rng = random.Random(args.seed + number)
+        client = transport()
+        status, _ = client.request('POST', '/login', {'email': reader_emails[number % len(reader_emails)],
+                                                      'password': PASSWORD})
+        if status not in (200, 302):
+            start_barrier.abort()
+            raise SystemExit(f'Login failed with status {status}')
+        workload = Workload(post_ids, category_names, WORDS, mix, rng)
+        for _ in range(args.warmup):
+            client.request(*workload.next_request()[1:])
+        results = []
+        start_barrier.wait()
+        for _ in range(per_thread):
+            endpoint, method, path, data = workload.next_request()
+            started = time.perf_counter()
+            status, statements = client.request(method, path, data)
+            results.append((endpoint, (time.perf_counter() - started) * 1000, status,
+                            int(statements) if statements is not None else None))
+        with samples_lock:
+            samples.extend(results)
+
+    start_barrier = threading.Barrier(args.threads + 1)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    counters.flush()
+    if server is not None:
+        server.shutdown()
+
+    endpoints = {}
+    for name in mix:
+        rows = [sample for sample in samples if sample[0] == name]
+        latencies = sorted(sample[1] for sample in rows)
+        statements = [sample[3] for sample in rows if sample[3] is not None]
+        endpoints[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for sample in rows if sample[2] >= 400),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+            'sql_per_request': sum(statements) / len(statements) if statements else None,
+            'sql_max': max(statements) if statements else None,
+        }
+    latencies = sorted(sample[1] for sample in samples)
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'transport': 'http' if args.server else 'test_client',
+        'threads': args.threads,
+        'mix': mix,
+        'volumes': volumes,
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2] >= 400),
+        'duration_s': elapsed,
+        'requests_per_s': len(samples) / elapsed if elapsed else None,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'endpoints': endpoints,
+    }
+
+
+def print_report(result):
+    print(f"{result['requests']} requests in {result['duration_s']:.1f}s "
+          f"({result['requests_per_s']:.1f} req/s, {result['errors']} errors) over {result['transport']}")
+    print(f"{'endpoint':<16}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'sql/req':>9}")
+    for name, stats in result['endpoints'].items():
+        if not stats['requests']:
+            continue
+        print(f"{name:<16}{stats['requests']:>7}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['sql_per_request'] or 0:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='Seeded SQLite file (default: seed a small temporary one).')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per thread.')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--server', action='store_true', help='Drive a local WSGI server over HTTP.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='JSON result file (default: benchmarks/results/<time>-<commit>.json).')
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    with tempfile.TemporaryDirectory() as tmp:
+        database = args.database
+        if database is None:
+            database = os.path.join(tmp, 'loadtest.db')
+            os.environ['DATABASE_URL'] = 'sqlite:///' + database
+            sys.path.insert(0, ROOT)
+            from app import app
+            from seed import seed
+            with app.app_context():
+                seed(users=500, posts=2000, comments=20000, batch_size=2000)
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+        result = run(args, mix)
+
+    print_report(result)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{result['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'Saved {output}')
+
+
+if __name__ == '__main__':
+    main()
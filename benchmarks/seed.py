@@ -0,0 +1,163 @@
+"""Seed a database with synthetic users, posts and comments for benchmarking.
+
+Usage: DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py \\
+           [--users 50000] [--posts 100000] [--comments 1000000]
+
+Rows are written with multi-row Core inserts in batches, then the comment
+counts, the search index and the precomputed rankings are rebuilt so every
+route sees realistic data. Every seeded user has the password ``password``; ``bench0@example.com``
+is an admin. Refuses to run against a database that already has posts.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CATEGORIES = ['Technology', 'Business', 'Lifestyle', 'Entertainment', 'Sports', 'Health', 'Politics']
+PASSWORD = 'password'
+
+# Small Zipf-ish vocabulary so search terms and related-post overlap behave like real text
+WORDS = """
+market energy python election league vaccine startup climate budget striker festival album
+satellite inflation coach senate hospital algorithm funding concert recipe marathon policy cloud
+server battery garden travel museum protest merger robot quantum virus stadium ocean housing
+bank crypto chip design fashion film series season trial court migration school teacher study
+""".split()
+
+
+def sentence(rng, length):
+    words = rng.choices(WORDS, weights=range(len(WORDS), 0, -1), k=length)
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng, sentences):
+    return ' '.join(sentence(rng, rng.randint(6, 16)) for _ in range(sentences))
+
+
+def insert_batches(table, rows, batch_size, label):
+    from models import db
+    inserted = 0
+    batch = []
+    started = time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            inserted += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        inserted += len(batch)
+    print(f'{label}: {inserted} rows in {time.perf_counter() - started:.1f}s')
+    return inserted
+
+
+def seed(users=50000, posts=100000, comments=1000000, subscribers=0, batch_size=5000,
+         days=365, seed_value=42, derived=True):
+    from werkzeug.security import generate_password_hash
+    from content import derive
+    from models import db, User, Post, Category, Comment, NewsletterSubscription
+    from migrations import upgrade
+
+    rng = random.Random(seed_value)
+    upgrade()
+    if db.session.query(Post.id).first() is not None:
+        raise SystemExit('Database already has posts; seed an empty database.')
+
+    for name in CATEGORIES:
+        if Category.query.filter_by(name=name).first() is None:
+            db.session.add(Category(name=name))
+    db.session.commit()
+    category_ids = [category.id for category in Category.query.order_by(Category.id)]
+
+    now = datetime.utcnow()
+    first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    password_hash = generate_password_hash(PASSWORD)  # hashing once keeps seeding fast
+    insert_batches(User.__table__, (
+        {'username': f'bench{n}', 'email': f'bench{n}@example.com', 'password_hash': password_hash,
+         'profile_picture': 'default_profile.png', 'bio': '',
+         'role': 'admin' if n == 0 else 'author' if n % 50 == 0 else 'reader',
+         'created_at': now - timedelta(days=days)}
+        for n in range(users)
+    ), batch_size, 'users')
+    author_ids = [first_user + n for n in range(0, users, 50)]
+
+    def post_rows():
+        for n in range(posts):
+            created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+            content = '\n\n'.join(paragraph(rng, rng.randint(3, 6)) for _ in range(rng.randint(3, 8)))
+            yield {'title': sentence(rng, rng.randint(4, 9)).rstrip('.'), 'content': content, **derive(content),
+                   'created_at': created_at, 'updated_at': created_at,
+                   'is_published': rng.random() < 0.9, 'is_featured': rng.random() < 0.01,
+                   'views': int(rng.paretovariate(1.2) * 10), 'likes': int(rng.paretovariate(1.5)),
+                   'author_id': rng.choice(author_ids), 'category_id': rng.choice(category_ids)}
+
+    first_post = (db.session.query(db.func.max(Post.id)).scalar() or 0) + 1
+    insert_batches(Post.__table__, post_rows(), batch_size, 'posts')
+
+    def comment_rows():
+        for n in range(comments):
+            # Popular posts collect most comments
+            post_id = first_post + min(int(rng.paretovariate(0.8)) - 1, posts - 1) if rng.random() < 0.5 \
+                else first_post + rng.randrange(posts)
+            yield {'content': sentence(rng, rng.randint(5, 25)), 'is_approved': True,
+                   'created_at': now - timedelta(seconds=rng.randint(0, days * 86400)),
+                   'user_id': first_user + rng.randrange(users), 'post_id': post_id}
+
+    if posts and users:
+        insert_batches(Comment.__table__, comment_rows(), batch_size, 'comments')
+        from queries import recount_comments
+        recount_comments(db.session.connection())
+        db.session.commit()
+    insert_batches(NewsletterSubscription.__table__, (
+        {'email': f'subscriber{n}@example.com', 'subscribed_at': now, 'is_active': True}
+        for n in range(subscribers)
+    ), batch_size, 'subscribers')
+
+    if derived:
+        import analytics
+        import rankings
+        import search
+        started = time.perf_counter()
+        search.search_index.rebuild()
+        print(f'search index: {time.perf_counter() - started:.1f}s')
+        started = time.perf_counter()
+        rankings.rebuild(db.session.connection())
+        db.session.commit()
+        print(f'rankings: {time.perf_counter() - started:.1f}s')
+        started = time.perf_counter()
+        analytics.rebuild(db.session.connection())
+        db.session.commit()
+        print(f'statistics: {time.perf_counter() - started:.1f}s')
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--comments', type=int, default=1000000)
+    parser.add_argument('--subscribers', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many days.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-derived', action='store_true', help='Do not rebuild search, rankings and statistics.')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from app import app
+    with app.app_context():
+        seed(args.users, args.posts, args.comments, args.subscribers, args.batch_size,
+             args.days, args.seed, derived=not args.skip_derived)
+
+
+if __name__ == '__main__':
+    main()
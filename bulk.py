@@ -0,0 +1,503 @@
+"""Bulk import and export of categories, users, posts and comments.
+
+``flask bulk-export KIND PATH`` streams rows from ``yield_per`` queries
+straight to a JSONL or CSV file (by extension, or --format; ``-`` is stdout).
+``flask bulk-import KIND PATH`` reads the same formats back one record at a
+time and writes them with multi-row inserts, committing every --batch-size
+records. Categories and authors are referenced by name and resolved through
+maps loaded once per run; unknown categories are created, records with an
+unknown author or post are skipped.
+
+Each committed batch also records the position reached in the input in
+``import_checkpoint``, in the same transaction, so an interrupted import
+resumes exactly after the last committed batch when run again. Exported post
+ids are kept on import so comment files and old URLs still line up; a post
+whose id is already taken is skipped. On PostgreSQL the post id sequence is
+moved past the imported ids after each batch, since explicit ids do not
+advance it.
+
+With --images DIR, featured images and profile pictures are copied from (or
+to) DIR/posts and DIR/profiles by a thread pool while the batch is being
+built; a batch is only committed once its copies are done.
+"""
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+from sqlalchemy import text
+from werkzeug.utils import secure_filename
+
+from content import derive
+
+KINDS = ('categories', 'users', 'posts', 'comments')
+FIELDS = {
+    'categories': ['name'],
+    'users': ['username', 'email', 'password_hash', 'role', 'bio', 'profile_picture', 'created_at'],
+    'posts': ['id', 'title', 'content', 'category', 'author', 'created_at', 'updated_at',
+              'is_published', 'is_featured', 'views', 'likes', 'featured_image'],
+    'comments': ['post_id', 'author', 'content', 'created_at', 'is_approved'],
+}
+ROLES = ('reader', 'author', 'admin')
+UNUSABLE_PASSWORD = '!'  # never matches; imported users without a hash must reset their password
+YIELD_PER = 1000
+
+
+def _bool(value, default=False):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def _int(value, default=0):
+    if value is None or value == '':
+        return default
+    return int(value)
+
+
+def _datetime(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).rstrip('Z'))
+
+
+def _filename(value):
+    # Upload names are used as paths under UPLOAD_FOLDER
+    return secure_filename(value) if value else None
+
+
+def _format(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise click.ClickException(f'Line {number} is not valid JSON: {e}')
+
+
+class RecordWriter:
+    def __init__(self, stream, fmt, fields):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=fields, extrasaction='ignore')
+            self.writer.writeheader()
+
+    def write(self, record):
+        record = {key: value.isoformat() if isinstance(value, datetime) else value
+                  for key, value in record.items()}
+        if self.fmt == 'csv':
+            self.writer.writerow({key: str(value).lower() if isinstance(value, bool) else value
+                                  for key, value in record.items()})
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class Progress:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.skipped = 0
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed else 0.0
+
+    def report(self, final=False):
+        skipped = f', {self.skipped} skipped' if self.skipped else ''
+        prefix = 'done: ' if final else ''
+        click.echo(f'{prefix}{self.label}: {self.rows} rows{skipped}, {self.rate():.0f} rows/s', err=True)
+
+
+def copy_file(source, target):
+    """Copy ``source`` to ``target`` unless an identical-size copy is already there."""
+    if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f'{target}.tmp{os.getpid()}'
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+    return True
+
+
+class ImageCopier:
+    def __init__(self, source_root, target_root, workers):
+        self.source_root = source_root
+        self.target_root = target_root
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-images')
+        self.pending = []
+        self.copied = 0
+        self.failed = 0
+
+    def submit(self, folder, filename, record=None, field=None):
+        source = os.path.join(self.source_root, folder, filename)
+        target = os.path.join(self.target_root, folder, filename)
+        self.pending.append((self.executor.submit(copy_file, source, target), source, record, field))
+
+    def wait(self):
+        """Finish the submitted copies; rows whose file could not be copied lose the reference."""
+        for future, source, record, field in self.pending:
+            try:
+                self.copied += bool(future.result())
+            except OSError as e:
+                self.failed += 1
+                print(f"Error copying image {source}: {e}")
+                if record is not None:
+                    record[field] = None
+        self.pending = []
+
+    def shutdown(self):
+        self.wait()
+        self.executor.shutdown(wait=True)
+
+
+# Export
+
+def _export_query(kind, include_password_hashes):
+    from models import db, User, Post, Category, Comment
+    if kind == 'categories':
+        return db.select(Category.name).order_by(Category.id)
+    if kind == 'users':
+        columns = [User.username, User.email, User.role, User.bio, User.profile_picture, User.created_at]
+        if include_password_hashes:
+            columns.append(User.password_hash)
+        return db.select(*columns).order_by(User.id)
+    if kind == 'posts':
+        return (db.select(Post.id, Post.title, Post.content, Category.name.label('category'),
+                          User.username.label('author'), Post.created_at, Post.updated_at, Post.is_published,
+                          Post.is_featured, Post.views, Post.likes, Post.featured_image)
+                .join(Category, Category.id == Post.category_id)
+                .join(User, User.id == Post.author_id)
+                .order_by(Post.id))
+    return (db.select(Comment.post_id, User.username.label('author'), Comment.content, Comment.created_at,
+                      Comment.is_approved)
+            .join(User, User.id == Comment.user_id)
+            .order_by(Comment.id))
+
+
+def export_records(kind, stream, fmt, images=None, include_password_hashes=False):
+    from models import db
+    fields = [field for field in FIELDS[kind] if field != 'password_hash' or include_password_hashes]
+    writer = RecordWriter(stream, fmt, fields)
+    progress = Progress(kind)
+    query = _export_query(kind, include_password_hashes).execution_options(yield_per=YIELD_PER)
+    for row in db.session.execute(query).mappings():
+        record = {field: row[field] for field in fields}
+        if images is not None:
+            if kind == 'posts' and record['featured_image']:
+                images.submit('posts', record['featured_image'])
+            elif kind == 'users' and record['profile_picture'] not in (None, 'default_profile.png'):
+                images.submit('profiles', record['profile_picture'])
+        writer.write(record)
+        progress.rows += 1
+        if progress.rows % (YIELD_PER * 10) == 0:
+            progress.report()
+    return progress
+
+
+# Import
+
+class Importer:
+    """Turns batches of records into insert rows, resolving names through in-memory maps."""
+
+    def __init__(self, kind, images=None):
+        from models import db, User, Category
+        self.kind = kind
+        self.images = images
+        self.categories = dict(db.session.execute(db.select(Category.name, Category.id)).all())
+        self.users = {}
+        self.emails = set()
+        if kind in ('users', 'posts', 'comments'):
+            self.users = dict(db.session.execute(db.select(User.username, User.id)).all())
+        if kind == 'users':
+            self.emails = {email.lower() for email, in db.session.execute(db.select(User.email))}
+
+    def write(self, records):
+        """Insert one batch; returns (imported, skipped). The caller commits."""
+        return getattr(self, f'_write_{self.kind}')(records)
+
+    def _category_id(self, name):
+        from models import db, Category
+        if name not in self.categories:
+            category = Category(name=name)
+            db.session.add(category)
+            db.session.flush()
+            self.categories[name] = category.id
+        return self.categories[name]
+
+    def _write_categories(self, records):
+        from models import db, Category
+        names = []
+        for record in records:
+            name = (record.get('name') or '').strip()
+            if name and name not in self.categories and name not in names:
+                names.append(name)
+        if names:
+            db.session.execute(db.insert(Category), [{'name': name} for name in names])
+            self.categories.update(db.session.execute(
+                db.select(Category.name, Category.id).where(Category.name.in_(names))).all())
+        return len(names), len(records) - len(names)
+
+    def _write_users(self, records):
+        from models import db, User
+        rows = []
+        for record in records:
+            username = (record.get('username') or '').strip()
+            email = (record.get('email') or '').strip()
+            if not username or not email or username in self.users or email.lower() in self.emails:
+                continue
+            picture = _filename(record.get('profile_picture')) or 'default_profile.png'
+            row = {
+                'username': username, 'email': email,
+                'password_hash': record.get('password_hash') or UNUSABLE_PASSWORD,
+                'role': record.get('role') if record.get('role') in ROLES else 'reader',
+                'bio': record.get('bio') or '', 'profile_picture': picture,
+                'created_at': _datetime(record.get('created_at')) or datetime.utcnow(),
+            }
+            if self.images is not None and picture != 'default_profile.png':
+                self.images.submit('profiles', picture, row, 'profile_picture')
+            self.users[username] = None
+            self.emails.add(email.lower())
+            rows.append(row)
+        if self.images is not None:
+            self.images.wait()
+            for row in rows:
+                row['profile_picture'] = row['profile_picture'] or 'default_profile.png'
+        if rows:
+            db.session.execute(db.insert(User), rows)
+            self.users.update(db.session.execute(
+                db.select(User.username, User.id).where(User.username.in_([row['username'] for row in rows]))
+            ).all())
+        return len(rows), len(records) - len(rows)
+
+    def _write_posts(self, records):
+        from models import db, Post
+        wanted_ids = [_int(record.get('id'), None) for record in records]
+        taken = set(db.session.execute(
+            db.select(Post.id).where(Post.id.in_([post_id for post_id in wanted_ids if post_id]))).scalars())
+        with_id, without_id = [], []
+        for record, post_id in zip(records, wanted_ids):
+            author_id = self.users.get(record.get('author'))
+            category = (record.get('category') or '').strip()
+            if author_id is None or not category or not record.get('title') or post_id in taken:
+                continue
+            created_at = _datetime(record.get('created_at')) or datetime.utcnow()
+            content = record.get('content') or ''
+            row = {
+                'title': record['title'], 'content': content, **derive(content),
+                'category_id': self._category_id(category), 'author_id': author_id,
+                'created_at': created_at, 'updated_at': _datetime(record.get('updated_at')) or created_at,
+                'is_published': _bool(record.get('is_published'), True),
+                'is_featured': _bool(record.get('is_featured')),
+                'views': _int(record.get('views')), 'likes': _int(record.get('likes')),
+                'featured_image': _filename(record.get('featured_image')), 'comment_count': 0,
+            }
+            if self.images is not None and row['featured_image']:
+                self.images.submit('posts', row['featured_image'], row, 'featured_image')
+            if post_id:
+                taken.add(post_id)
+                row['id'] = post_id
+                with_id.append(row)
+            else:
+                without_id.append(row)
+        if self.images is not None:
+            self.images.wait()
+        # Separate statements: an executemany needs the same keys on every row
+        if with_id:
+            db.session.execute(db.insert(Post), with_id)
+            _sync_id_sequence('post')
+        if without_id:
+            db.session.execute(db.insert(Post), without_id)
+        imported = len(with_id) + len(without_id)
+        return imported, len(records) - imported
+
+    def _write_comments(self, records):
+        from models import db, Post, Comment
+        post_ids = {_int(record.get('post_id'), None) for record in records}
+        existing = set(db.session.execute(
+            db.select(Post.id).where(Post.id.in_([post_id for post_id in post_ids if post_id]))).scalars())
+        rows = []
+        for record in records:
+            post_id = _int(record.get('post_id'), None)
+            user_id = self.users.get(record.get('author'))
+            if post_id not in existing or user_id is None or not record.get('content'):
+                continue
+            rows.append({
+                'post_id': post_id, 'user_id': user_id, 'content': record['content'],
+                'created_at': _datetime(record.get('created_at')) or datetime.utcnow(),
+                'is_approved': _bool(record.get('is_approved'), True),
+            })
+        if rows:
+            db.session.execute(db.insert(Comment), rows)
+            counts = Counter(row['post_id'] for row in rows if row['is_approved'])
+            if counts:
+                # Plain SQL so the post's updated_at is left alone
+                db.session.execute(text("UPDATE post SET comment_count = comment_count + :n WHERE id = :id"),
+                                   [{'id': post_id, 'n': n} for post_id, n in counts.items()])
+        return len(rows), len(records) - len(rows)
+
+
+def _sync_id_sequence(table):
+    # Rows inserted with explicit ids leave a PostgreSQL serial behind; the next
+    # generated id (this batch's posts without one, or create_post) would collide
+    from models import db
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"))
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{int(stat.st_mtime)}'
+
+
+def import_records(kind, path, fmt, batch_size=1000, images=None, restart=False):
+    from models import db, ImportCheckpoint
+    checkpoint = None
+    if path != '-':
+        source = f'{kind}:{os.path.abspath(path)}'
+        fingerprint = _fingerprint(path)
+        checkpoint = db.session.get(ImportCheckpoint, source)
+        if checkpoint is not None and not restart:
+            if checkpoint.completed:
+                raise click.ClickException(f'{path} was already imported; pass --restart to import it again.')
+            if checkpoint.fingerprint != fingerprint:
+                click.echo(f'Warning: {path} changed since the last run (pass --restart to start over).', err=True)
+                checkpoint.fingerprint = fingerprint
+            click.echo(f'Resuming {kind} after record {checkpoint.position}.', err=True)
+        if checkpoint is None:
+            checkpoint = ImportCheckpoint(source=source, fingerprint=fingerprint)
+            db.session.add(checkpoint)
+        if restart:
+            checkpoint.fingerprint, checkpoint.position, checkpoint.completed = fingerprint, 0, False
+            checkpoint.imported = checkpoint.skipped = 0
+        db.session.commit()
+
+    importer = Importer(kind, images)
+    progress = Progress(kind)
+    skip = checkpoint.position if checkpoint is not None else 0
+    position = 0
+    batch = []
+
+    def flush():
+        try:
+            imported, skipped = importer.write(batch)
+        except (ValueError, TypeError, KeyError) as e:
+            db.session.rollback()
+            raise click.ClickException(f'Bad record in {position - len(batch) + 1}-{position}: {e!r}')
+        progress.rows += imported
+        progress.skipped += skipped
+        if checkpoint is not None:
+            checkpoint.position = position
+            checkpoint.imported += imported
+            checkpoint.skipped += skipped
+        db.session.commit()
+        batch.clear()
+        progress.report()
+
+    stream = sys.stdin if path == '-' else open(path, newline='' if fmt == 'csv' else None, encoding='utf-8')
+    try:
+        for record in read_records(stream, fmt):
+            position += 1
+            if position <= skip:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    if checkpoint is not None:
+        checkpoint.position = position
+        checkpoint.completed = True
+        db.session.commit()
+    return progress
+
+
+def init_bulk(app):
+    @app.cli.command('bulk-export')
+    @click.argument('kind', type=click.Choice(KINDS))
+    @click.argument('path')
+    @click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Default: from the file extension.')
+    @click.option('--images', type=click.Path(file_okay=False), help='Also copy uploaded images into this directory.')
+    @click.option('--workers', default=8, show_default=True, help='Image copy threads.')
+    @click.option('--include-password-hashes', is_flag=True, help='Export user password hashes.')
+    def bulk_export_command(kind, path, fmt, images, workers, include_password_hashes):
+        """Stream categories, users, posts or comments to a JSONL or CSV file."""
+        fmt = _format(path, fmt)
+        copier = ImageCopier(app.config['UPLOAD_FOLDER'], images, workers) if images else None
+        stream = sys.stdout if path == '-' else open(path, 'w', newline='' if fmt == 'csv' else None,
+                                                       encoding='utf-8')
+        try:
+            progress = export_records(kind, stream, fmt, copier, include_password_hashes)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+            if copier is not None:
+                copier.shutdown()
+        progress.report(final=True)
+        if copier is not None:
+            click.echo(f'images: {copier.copied} copied, {copier.failed} failed', err=True)
+
+    @app.cli.command('bulk-import')
+    @click.argument('kind', type=click.Choice(KINDS))
+    @click.argument('path')
+    @click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), help='Default: from the file extension.')
+    @click.option('--batch-size', default=1000, show_default=True, help='Records per insert and commit.')
+    @click.option('--images', type=click.Path(exists=True, file_okay=False),
+                  help='Copy referenced images from DIR/posts and DIR/profiles.')
+    @click.option('--workers', default=8, show_default=True, help='Image copy threads.')
+    @click.option('--restart', is_flag=True, help='Ignore the saved checkpoint and read the file from the start.')
+    @click.option('--skip-derived', is_flag=True, help='Do not rebuild search, rankings, statistics and image variants.')
+    def bulk_import_command(kind, path, fmt, batch_size, images, workers, restart, skip_derived):
+        """Import categories, users, posts or comments from a JSONL or CSV file (resumable)."""
+        from images import pipeline
+        from models import db
+        import analytics
+        import rankings
+        import search
+        fmt = _format(path, fmt)
+        copier = ImageCopier(images, app.config['UPLOAD_FOLDER'], workers) if images else None
+        try:
+            progress = import_records(kind, path, fmt, batch_size, copier, restart)
+        finally:
+            if copier is not None:
+                copier.shutdown()
+        progress.report(final=True)
+        if copier is not None:
+            click.echo(f'images: {copier.copied} copied, {copier.failed} failed', err=True)
+        if skip_derived or not progress.rows:
+            return
+        if kind == 'posts':
+            click.echo(f'Indexed {search.search_index.rebuild()} posts for search.', err=True)
+            with db.engine.begin() as conn:
+                click.echo(f'Ranked {rankings.rebuild(conn)} posts.', err=True)
+        elif kind == 'comments':
+            rankings.refresh_trending()
+        if kind in ('posts', 'comments'):
+            with db.engine.begin() as conn:
+                click.echo(f'Rebuilt statistics for {analytics.rebuild(conn)} authors.', err=True)
+        if copier is not None and copier.copied:
+            click.echo(f'Generated variants for {pipeline.backfill()} images.', err=True)
@@ -0,0 +1,242 @@
+"""Application cache with pluggable backends.
+
+``memory`` is a per-process LRU with TTL; ``sqlite`` keeps entries in a shared
+SQLite file so several worker processes see the same entries and the same
+invalidations. Both count hits, misses and evictions for sizing; lookups made
+with ``record=False`` (generations) are not counted.
+
+Invalidation is by generation: keys are built with ``cache.key(namespace, ...)``,
+which embeds the namespace's current generation, and ``cache.invalidate(namespace)``
+moves the namespace to a new generation. Stale entries are never read again
+and age out through the LRU/TTL.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def record(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class LRUCache:
+    name = 'memory'
+
+    def __init__(self, maxsize=1024, default_ttl=300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, record=True):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                if record:
+                    self.stats.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            if record:
+                self.stats.misses += 1
+            return MISSING
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        return dict(self.stats.as_dict(), backend=self.name, size=len(self._data), maxsize=self.maxsize)
+
+
+class SQLiteCache:
+    name = 'sqlite'
+
+    def __init__(self, path, maxsize=10000, default_ttl=300):
+        self.path = path
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, record=True):
+        now = time.time()
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                self._connect().execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                if record:
+                    self.stats.record('hits')
+                return pickle.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Cache read error: {e}")
+        if record:
+            self.stats.record('misses')
+        return MISSING
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + (ttl or self.default_ttl), now))
+            # Expired rows first, then least recently used past maxsize
+            evicted = conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,)).rowcount
+            evicted += conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)).rowcount
+            if evicted:
+                self.stats.record('evictions', evicted)
+        except sqlite3.Error as e:
+            print(f"Cache write error: {e}")
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def info(self):
+        size = self._connect().execute("SELECT count(*) FROM cache").fetchone()[0]
+        return dict(self.stats.as_dict(), backend=self.name, size=size, maxsize=self.maxsize)
+
+
+class NullCache:
+    name = 'null'
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key, record=True):
+        if record:
+            self.stats.record('misses')
+        return MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def info(self):
+        return dict(self.stats.as_dict(), backend=self.name, size=0, maxsize=0)
+
+
+def make_backend(name, maxsize, default_ttl, path=None):
+    if name == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, default_ttl=default_ttl)
+    if name == 'null':
+        return NullCache()
+    return LRUCache(maxsize=maxsize, default_ttl=default_ttl)
+
+
+class Cache:
+    def __init__(self):
+        self.backend = LRUCache()
+
+    def init_app(self, app):
+        self.backend = make_backend(
+            app.config.get('CACHE_BACKEND', 'memory'),
+            app.config.get('CACHE_MAX_ENTRIES', 1024),
+            app.config.get('CACHE_DEFAULT_TTL', 300),
+            app.config.get('CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'cache.db'),
+        )
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_set(self, key, create, ttl=None):
+        value = self.backend.get(key)
+        if value is MISSING:
+            value = create()
+            self.backend.set(key, value, ttl)
+        return value
+
+    def generation(self, namespace):
+        # Bookkeeping, not a cached value: kept out of the hit/miss stats
+        generation = self.backend.get(f'generation:{namespace}', record=False)
+        if generation is MISSING:
+            generation = uuid.uuid4().hex[:12]
+            # Generations must outlive the entries they address
+            self.backend.set(f'generation:{namespace}', generation, ttl=30 * 24 * 3600)
+        return generation
+
+    def key(self, namespace, *parts):
+        return ':'.join([namespace, self.generation(namespace), *map(str, parts)])
+
+    def invalidate(self, namespace):
+        self.backend.set(f'generation:{namespace}', uuid.uuid4().hex[:12], ttl=30 * 24 * 3600)
+
+    def info(self):
+        return self.backend.info()
+
+
+cache = Cache()
@@ -5,16 +5,127 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///daily_pulse.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Password hashing runs in a bounded process pool (0 workers hashes in the request thread; see auth.py)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS') or 2)
+    AUTH_HASH_QUEUE = int(os.environ.get('AUTH_HASH_QUEUE') or 8)  # jobs waiting beyond the workers before 503s
+    AUTH_HASH_TIMEOUT = 5
+    AUTH_HASH_NICE = 10
+    
+    # In-memory sliding-window login throttling
+    AUTH_THROTTLE_ENABLED = os.environ.get('AUTH_THROTTLE_ENABLED', 'true').lower() == 'true'
+    AUTH_THROTTLE_WINDOW = int(os.environ.get('AUTH_THROTTLE_WINDOW') or 300)
+    AUTH_THROTTLE_IP_LIMIT = int(os.environ.get('AUTH_THROTTLE_IP_LIMIT') or 30)  # failures and registrations per window
+    AUTH_THROTTLE_EMAIL_LIMIT = int(os.environ.get('AUTH_THROTTLE_EMAIL_LIMIT') or 5)  # failures per window
+    AUTH_THROTTLE_MAX_KEYS = 100000
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted for the client IP (0: none)
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR') or 0)
+    
+    # Connection pool and optional read replica (GET requests read from it; see database.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS') or 5)
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 10)
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 20)
+    DATABASE_POOL_TIMEOUT = 30
+    DATABASE_POOL_RECYCLE = 1800
+    DATABASE_POOL_PRE_PING = True
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,  # KiB per connection
+    } if os.environ.get('SQLITE_TUNING', 'true').lower() == 'true' else {}
+    
     # File upload configuration
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+    IMAGE_PROCESSING_SYNC = False  # process uploads inline (tests, CLI)
+    
+    # CSS/JS bundles in static/dist (rebuilt at startup when a source changed; see assets.py)
+    ASSETS_BUILD_ON_STARTUP = os.environ.get('ASSETS_BUILD_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Search configuration ('auto' uses SQLite FTS5 when available, 'memory' otherwise)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    
+    # Listing page size (category, search, dashboard); clients may ask for up to the max
+    POSTS_PER_PAGE = int(os.environ.get('POSTS_PER_PAGE') or 12)
+    MAX_POSTS_PER_PAGE = 50
+    COMMENTS_PER_PAGE = int(os.environ.get('COMMENTS_PER_PAGE') or 20)
+    DASHBOARD_SERIES_DAYS = 30  # daily activity shown on the dashboard (see analytics.py)
+    
+    # View/like counters are buffered in memory and flushed in batches
+    COUNTER_BUFFERING = os.environ.get('COUNTER_BUFFERING', 'true').lower() == 'true'
+    COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL') or 5)
+    COUNTER_FLUSH_SIZE = int(os.environ.get('COUNTER_FLUSH_SIZE') or 500)
+    
+    # Precomputed rankings (trending scores decay, so they are refreshed periodically)
+    TRENDING_WINDOW_DAYS = 14
+    TRENDING_REFRESH_INTERVAL = int(os.environ.get('TRENDING_REFRESH_INTERVAL') or 300)
+    
+    # Cache backend: 'memory' (per-process LRU), 'sqlite' (shared between workers) or 'null'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH')  # defaults to instance/cache.db
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 1024)
+    CACHE_DEFAULT_TTL = 300
+    HOMEPAGE_CACHE_TTL = 120
+    
+    # Feeds and sitemaps (post sitemaps hold up to SITEMAP_CHUNK_SIZE ids each; the protocol allows 50,000)
+    FEED_SIZE = 50
+    SITEMAP_CHUNK_SIZE = 10000
+    
+    # Conditional GET for the read-mostly pages and whole-page caching for anonymous readers
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() == 'true'
+    PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND') or 'memory'
+    PAGE_CACHE_SQLITE_PATH = os.environ.get('PAGE_CACHE_SQLITE_PATH')  # defaults to instance/page_cache.db
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES') or 500)
+    PAGE_CACHE_TTL = 60
+    PAGE_CACHE_MAX_AGE = 60  # Cache-Control max-age for anonymous pages
+    PAGE_CACHE_VERSION_TTL = 1  # seconds a process reuses a listing validator read from the database
+    
+    # Logged-in user snapshots for the user loader (same backends as the cache above)
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND') or 'memory'
+    USER_CACHE_SQLITE_PATH = os.environ.get('USER_CACHE_SQLITE_PATH')  # defaults to instance/user_cache.db
+    USER_CACHE_MAX_ENTRIES = 10000
+    USER_CACHE_TTL = 300
+    
+    # Maximum SQL statements per request, enforced when TESTING is on
+    SQL_QUERY_BUDGET_ENFORCE = False
+    SQL_QUERY_BUDGETS = {
+        'index': 5,
+        'category_posts': 3,
+        'search': 4,
+        'dashboard': 4,
+        'review_queue': 3,
+        'post_detail': 4,
+        'api_post_comments': 2,
+        'api_add_comment': 6,
+    }
+    
+    # Opt-in request instrumentation (/admin/instrumentation and instance/requests.log)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() == 'true'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)  # fraction of requests run under cProfile
+    INSTRUMENTATION_SLOW_STATEMENTS = 20
+    INSTRUMENTATION_LOG_PATH = os.environ.get('INSTRUMENTATION_LOG_PATH')  # defaults to instance/requests.log
+    INSTRUMENTATION_LOG_MIN_MS = float(os.environ.get('INSTRUMENTATION_LOG_MIN_MS') or 0)
+    INSTRUMENTATION_LOG_MAX_BYTES = 10 * 1024 * 1024
+    INSTRUMENTATION_LOG_BACKUPS = 5
     
     # Email configuration (optional - comment out if not using email)
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
-    MAIL_USE_TLS = True
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@dailypulse.com'
-    ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@dailypulse.com'
\ No newline at end of file
+    ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@dailypulse.com'
+    
+    # Outbound mail queue (for a local SMTP stand-in use MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=false)
+    MAIL_QUEUE_WORKERS = int(os.environ.get('MAIL_QUEUE_WORKERS') or 1)
+    MAIL_QUEUE_BATCH_SIZE = 50
+    MAIL_QUEUE_POLL_INTERVAL = 5
+    MAIL_MAX_ATTEMPTS = 5
+    MAIL_RETRY_BASE_DELAY = 30  # seconds, doubled after each failed attempt
\ No newline at end of file
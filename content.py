@@ -0,0 +1,160 @@
+"""Derived post body fields, computed when a post is written.
+
+``derive(content)`` returns the sanitized HTML body, a plain-text excerpt,
+the word count and the reading time. ``Post.set_content()`` stores them so
+listings never load the article body and post pages never re-render it.
+
+Bodies may be plain text (blank lines separate paragraphs) or HTML; HTML is
+reduced to an allowlist of tags and attributes, and script/style contents are
+dropped.
+"""
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+
+import click
+from sqlalchemy import text
+
+EXCERPT_LENGTH = 300
+WORDS_PER_MINUTE = 200
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h2', 'h3', 'h4', 'strong', 'b', 'em', 'i', 'u', 's', 'a', 'ul', 'ol', 'li',
+    'blockquote', 'code', 'pre', 'img', 'figure', 'figcaption',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+ALLOWED_ATTRIBUTES = {'a': {'href', 'title'}, 'img': {'src', 'alt', 'title'}}
+URL_ATTRIBUTES = {'href', 'src'}
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'template'}
+BLOCK_TAGS = {'p', 'br', 'hr', 'h2', 'h3', 'h4', 'li', 'blockquote', 'pre', 'figure', 'figcaption'}
+
+_tag_re = re.compile(r'<[a-zA-Z/!]')
+_safe_url_re = re.compile(r'^(https?:|mailto:|/|#|[^:]*$)', re.IGNORECASE)
+_whitespace_re = re.compile(r'\s+')
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not _safe_url_re.match(value.strip()):
+                continue
+            rendered.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == 'a':
+            rendered.append(' rel="nofollow noopener"')
+        self.html.append(f"<{tag}{''.join(rendered)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in self.open_tags and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # Close anything left open inside this element
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self.text.append(' ')
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.html.append(escape(data, quote=False))
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.html.append(f'</{self.open_tags.pop()}>')
+
+
+def _plain_paragraphs(value):
+    blocks = [block.strip() for block in re.split(r'\n\s*\n', value.replace('\r\n', '\n'))]
+    return ''.join('<p>{}</p>'.format(escape(block, quote=False).replace('\n', '<br>'))
+                   for block in blocks if block)
+
+
+def excerpt(plain, length=EXCERPT_LENGTH):
+    if len(plain) <= length:
+        return plain
+    cut = plain[:length].rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;:.-')
+
+
+def derive(content):
+    content = content or ''
+    if _tag_re.search(content):
+        parser = _Sanitizer()
+        parser.feed(content)
+        parser.close()
+        html, plain = ''.join(parser.html), ''.join(parser.text)
+    else:
+        html, plain = _plain_paragraphs(content), content
+    plain = _whitespace_re.sub(' ', plain).strip()
+    words = len(plain.split())
+    return {
+        'content_html': html,
+        'excerpt': excerpt(plain),
+        'word_count': words,
+        'reading_time': max(1, math.ceil(words / WORDS_PER_MINUTE)),
+    }
+
+
+def backfill(conn, batch_size=500, force=False):
+    """Fill the derived columns for rows written before they existed."""
+    updated = 0
+    last_id = 0
+    condition = '' if force else 'AND content_html IS NULL'
+    while True:
+        rows = conn.execute(text(
+            f"SELECT id, content FROM post WHERE id > :last_id {condition} ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).all()
+        if not rows:
+            return updated
+        conn.execute(text(
+            "UPDATE post SET content_html = :content_html, excerpt = :excerpt, "
+            "word_count = :word_count, reading_time = :reading_time WHERE id = :id"
+        ), [dict(derive(row.content), id=row.id) for row in rows])
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+def init_content(app):
+    @app.cli.command('content-backfill')
+    @click.option('--batch-size', default=500, show_default=True)
+    @click.option('--force', is_flag=True, help='Recompute rows that already have derived fields.')
+    def content_backfill_command(batch_size, force):
+        """Compute rendered HTML, excerpts and reading times for existing posts."""
+        from models import db
+        with db.engine.begin() as conn:
+            count = backfill(conn, batch_size, force)
+        click.echo(f'Updated {count} posts.')
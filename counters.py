@@ -0,0 +1,123 @@
+import atexit
+import threading
+
+from sqlalchemy import text
+
+FIELDS = ('views', 'likes')
+
+
+class CounterBuffer:
+    """Accumulates post view/like deltas in memory and writes them in batches.
+
+    Each flush is a single transaction of ``UPDATE post SET views = views + ?``
+    statements, so concurrent increments are never lost to a read-modify-write.
+    """
+
+    def __init__(self, flush_interval=5.0, flush_size=500):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.enabled = True
+        self._app = None
+        self._pending = {}  # post_id -> {'views': n, 'likes': n}
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get('COUNTER_BUFFERING', True)
+        self.flush_interval = app.config.get('COUNTER_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_size = app.config.get('COUNTER_FLUSH_SIZE', self.flush_size)
+        atexit.register(self.shutdown)
+
+    def on_write(self, listener):
+        """Call ``listener(conn, batch)`` inside each write transaction (batch: post_id -> deltas)."""
+        self._listeners.append(listener)
+
+    def incr(self, post_id, field, amount=1):
+        if not self.enabled:
+            self._write({post_id: {field: amount}})
+            return
+        with self._lock:
+            deltas = self._pending.setdefault(post_id, dict.fromkeys(FIELDS, 0))
+            deltas[field] += amount
+            self._pending_total += amount
+            due = self._pending_total >= self.flush_size
+        # The background thread flushes on the time threshold
+        self._ensure_thread()
+        if due:
+            self.flush()
+
+    def pending(self, post_id, field):
+        with self._lock:
+            deltas = self._pending.get(post_id)
+            return deltas[field] if deltas else 0
+
+    def discard(self, post_id):
+        with self._lock:
+            deltas = self._pending.pop(post_id, None)
+            if deltas:
+                self._pending_total -= sum(deltas.values())
+
+    def flush(self):
+        # Only one flush at a time; a concurrent caller will be picked up next round
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_total = 0
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    print(f"Counter flush error: {e}")
+                    self._restore(batch)
+                    return 0
+            return len(batch)
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, batch):
+        params = [{'id': post_id, 'views': deltas.get('views', 0), 'likes': deltas.get('likes', 0)}
+                  for post_id, deltas in batch.items()]
+        from models import db
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    "UPDATE post SET views = COALESCE(views, 0) + :views, "
+                    "likes = COALESCE(likes, 0) + :likes WHERE id = :id"
+                ), params)
+                for listener in self._listeners:
+                    listener(conn, batch)
+
+    def _restore(self, batch):
+        with self._lock:
+            for post_id, deltas in batch.items():
+                current = self._pending.setdefault(post_id, dict.fromkeys(FIELDS, 0))
+                for field, amount in deltas.items():
+                    current[field] += amount
+                    self._pending_total += amount
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stop.clear()
+                    self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._app is not None:
+            self.flush()
+
+
+counters = CounterBuffer()
@@ -0,0 +1,104 @@
+"""Database engine configuration and read/write routing.
+
+``init_database(app)`` builds the engine options from the DATABASE_* settings
+(pool size, overflow, timeout, recycle and pre-ping) and registers the
+optional read replica as the ``replica`` bind before initialising
+Flask-SQLAlchemy. SQLite connections get SQLITE_PRAGMAS applied as they are
+opened (WAL, synchronous=NORMAL, busy_timeout, mmap and page cache size).
+
+With DATABASE_REPLICA_URL set, ``RoutingSession`` sends the SELECTs of GET and
+HEAD requests to the replica. Writes, flushes and reads outside a request use
+the primary, and so does every read after the session has written. A request
+that writes also sets a short-lived cookie so the same client reads from the
+primary until the replica has had time to catch up. Keeping the replica in
+sync is the database's job; schema migrations run against the primary only.
+"""
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA = 'replica'
+PRIMARY_COOKIE = 'db_primary'
+READ_METHODS = ('GET', 'HEAD')
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri, config):
+    """Pool options for ``uri``; in-memory SQLite keeps Flask-SQLAlchemy's StaticPool."""
+    if _is_memory_sqlite(make_url(uri)):
+        return {}
+    return {
+        'pool_size': config['DATABASE_POOL_SIZE'],
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+        'pool_recycle': config['DATABASE_POOL_RECYCLE'],
+        'pool_pre_ping': config['DATABASE_POOL_PRE_PING'],
+    }
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+class RoutingSession(Session):
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                self.wrote = True
+            elif clause is not None and self._use_replica():
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self):
+        return (not self.wrote and has_request_context() and request.method in READ_METHODS
+                and not g.get('db_primary') and REPLICA in self._db.engines)
+
+
+def init_database(app):
+    from models import db
+
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(uri, config))
+    replica_uri = config.get('DATABASE_REPLICA_URL')
+    if replica_uri:
+        binds = config.setdefault('SQLALCHEMY_BINDS', {})
+        binds[REPLICA] = {'url': replica_uri, **engine_options(replica_uri, config)}
+    db.init_app(app)
+
+    with app.app_context():
+        for engine in set(db.engines.values()):
+            apply_sqlite_pragmas(engine, config.get('SQLITE_PRAGMAS'))
+
+    if not replica_uri:
+        return
+    sticky_seconds = config.get('DATABASE_REPLICA_STICKY_SECONDS', 5)
+
+    @app.before_request
+    def pin_recent_writers():
+        if request.cookies.get(PRIMARY_COOKIE):
+            g.db_primary = True
+
+    @app.after_request
+    def mark_writer(response):
+        # Reads right after this client's own write must not hit a lagging replica
+        if (request.method not in READ_METHODS and db.session.registry.has() and db.session().wrote
+                and sticky_seconds):
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=sticky_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,173 @@
+"""RSS/Atom feeds and XML sitemaps.
+
+All documents are streamed: rows come from ``yield_per`` queries and each
+entry is yielded as it is formatted, so memory use does not grow with the
+archive. Post sitemaps are chunked by id range (SITEMAP_CHUNK_SIZE ids per
+file), which lets the sitemap index list its chunks from ``max(id)`` alone.
+Conditional GET comes from the page cache validators registered in app.py,
+which read the post table (queries.listing_version); category feeds only
+change with their own category.
+"""
+from datetime import timezone
+from email.utils import format_datetime
+from itertools import chain
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import Response, abort, current_app, stream_with_context, url_for
+
+from models import db, User, Post, Category
+
+YIELD_PER = 500
+
+
+def _rfc822(value):
+    return format_datetime(value.replace(tzinfo=timezone.utc))
+
+
+def _rfc3339(value):
+    return value.replace(microsecond=0).isoformat() + 'Z'
+
+
+def _feed_rows(category_id=None):
+    query = (db.select(Post.id, Post.title, Post.excerpt, Post.content_html, Post.created_at,
+                       db.func.coalesce(Post.updated_at, Post.created_at).label('modified'),
+                       User.username, Category.name.label('category'))
+             .join(User, User.id == Post.author_id)
+             .join(Category, Category.id == Post.category_id)
+             .where(Post.is_published == True)
+             .order_by(Post.created_at.desc(), Post.id.desc())
+             .limit(current_app.config['FEED_SIZE']))
+    if category_id is not None:
+        query = query.where(Post.category_id == category_id)
+    return db.session.execute(query.execution_options(yield_per=YIELD_PER))
+
+
+def _category_or_404(category_name):
+    category = Category.query.filter_by(name=category_name).first()
+    if category is None:
+        abort(404)
+    return category
+
+
+def _stream(generate, mimetype):
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def rss(category_name=None):
+    category = _category_or_404(category_name) if category_name else None
+    title = f"Daily Pulse - {category.name}" if category else 'Daily Pulse'
+    link = (url_for('category_posts', category_name=category.name, _external=True) if category
+            else url_for('index', _external=True))
+    self_url = url_for('feed_rss', category_name=category_name, _external=True)
+
+    def generate():
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+               f'<title>{escape(title)}</title><link>{escape(link)}</link>'
+               f'<description>{escape(title)} latest posts</description>'
+               f'<atom:link href={quoteattr(self_url)} rel="self" type="application/rss+xml"/>')
+        for row in _feed_rows(category.id if category else None):
+            url = url_for('post_detail', post_id=row.id, _external=True)
+            yield (f'<item><title>{escape(row.title)}</title><link>{escape(url)}</link>'
+                   f'<guid isPermaLink="true">{escape(url)}</guid>'
+                   f'<pubDate>{_rfc822(row.created_at)}</pubDate>'
+                   f'<category>{escape(row.category)}</category>'
+                   f'<description>{escape(row.excerpt or "")}</description></item>')
+        yield '</channel></rss>\n'
+
+    return _stream(generate, 'application/rss+xml')
+
+
+def atom(category_name=None):
+    category = _category_or_404(category_name) if category_name else None
+    title = f"Daily Pulse - {category.name}" if category else 'Daily Pulse'
+    link = (url_for('category_posts', category_name=category.name, _external=True) if category
+            else url_for('index', _external=True))
+    self_url = url_for('feed_atom', category_name=category_name, _external=True)
+
+    def generate():
+        rows = iter(_feed_rows(category.id if category else None))
+        first = next(rows, None)  # the newest entry dates the feed
+        updated = _rfc3339(first.modified) if first else '1970-01-01T00:00:00Z'
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<feed xmlns="http://www.w3.org/2005/Atom">'
+               f'<title>{escape(title)}</title><id>{escape(self_url)}</id><updated>{updated}</updated>'
+               f'<link href={quoteattr(link)}/><link href={quoteattr(self_url)} rel="self"/>')
+        for row in chain([first] if first else [], rows):
+            url = url_for('post_detail', post_id=row.id, _external=True)
+            yield (f'<entry><title>{escape(row.title)}</title><id>{escape(url)}</id>'
+                   f'<link href={quoteattr(url)}/>'
+                   f'<published>{_rfc3339(row.created_at)}</published>'
+                   f'<updated>{_rfc3339(row.modified)}</updated>'
+                   f'<author><name>{escape(row.username)}</name></author>'
+                   f'<category term={quoteattr(row.category)}/>'
+                   f'<summary>{escape(row.excerpt or "")}</summary>'
+                   f'<content type="html">{escape(row.content_html or "")}</content></entry>')
+        yield '</feed>\n'
+
+    return _stream(generate, 'application/atom+xml')
+
+
+def sitemap_index():
+    chunk_size = current_app.config['SITEMAP_CHUNK_SIZE']
+    last_id = db.session.query(db.func.max(Post.id)).scalar() or 0
+
+    def generate():
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+        yield f'<sitemap><loc>{escape(url_for("sitemap_pages", _external=True))}</loc></sitemap>'
+        for chunk in range(last_id // chunk_size + 1):
+            yield f'<sitemap><loc>{escape(url_for("sitemap_posts", chunk=chunk, _external=True))}</loc></sitemap>'
+        yield '</sitemapindex>\n'
+
+    return _stream(generate, 'application/xml')
+
+
+def sitemap_pages():
+    def generate():
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+        for endpoint in ('index', 'about'):
+            yield f'<url><loc>{escape(url_for(endpoint, _external=True))}</loc></url>'
+        for name, in db.session.execute(db.select(Category.name).order_by(Category.name)):
+            yield f'<url><loc>{escape(url_for("category_posts", category_name=name, _external=True))}</loc></url>'
+        yield '</urlset>\n'
+
+    return _stream(generate, 'application/xml')
+
+
+def sitemap_posts(chunk):
+    chunk_size = current_app.config['SITEMAP_CHUNK_SIZE']
+    # The index lists chunks up to max(id); anything past that was never linked
+    if chunk > (db.session.query(db.func.max(Post.id)).scalar() or 0) // chunk_size:
+        abort(404)
+    query = (db.select(Post.id, db.func.coalesce(Post.updated_at, Post.created_at).label('modified'))
+             .where(Post.is_published == True,
+                    Post.id > chunk * chunk_size, Post.id <= (chunk + 1) * chunk_size)
+             .order_by(Post.id))
+
+    def generate():
+        yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+        for row in db.session.execute(query.execution_options(yield_per=YIELD_PER)):
+            yield (f'<url><loc>{escape(url_for("post_detail", post_id=row.id, _external=True))}</loc>'
+                   f'<lastmod>{_rfc3339(row.modified)}</lastmod></url>')
+        yield '</urlset>\n'
+
+    return _stream(generate, 'application/xml')
+
+
+def robots_txt():
+    return Response(f'User-agent: *\nAllow: /\nSitemap: {url_for("sitemap_index", _external=True)}\n',
+                    mimetype='text/plain')
+
+
+def init_feeds(app):
+    app.add_url_rule('/feed.xml', 'feed_rss', rss)
+    app.add_url_rule('/feed.atom', 'feed_atom', atom)
+    app.add_url_rule('/category/<category_name>/feed.xml', 'feed_rss', rss)
+    app.add_url_rule('/category/<category_name>/feed.atom', 'feed_atom', atom)
+    app.add_url_rule('/sitemap.xml', 'sitemap_index', sitemap_index)
+    app.add_url_rule('/sitemap-pages.xml', 'sitemap_pages', sitemap_pages)
+    app.add_url_rule('/sitemap-posts-<int:chunk>.xml', 'sitemap_posts', sitemap_posts)
+    app.add_url_rule('/robots.txt', 'robots_txt', robots_txt)
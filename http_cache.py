@@ -0,0 +1,166 @@
+"""Conditional GET and full-page caching for read-mostly pages.
+
+Endpoints registered with ``page_cache.cacheable()`` supply a cheap version
+function (one small query at most) that returns a token and a last-modified
+time. Before the view runs, those become an ETag and Last-Modified header;
+a matching If-None-Match/If-Modified-Since is answered with 304 without
+rendering. Anonymous responses are also stored whole, keyed by the ETag, so
+a repeat visit is served from the page cache and a new version simply uses
+new keys.
+
+Listing and feed validators come from the post table (queries.listing_version),
+so writes by other workers, imports and raw SQL change them too. Each process
+reuses a listing version for PAGE_CACHE_VERSION_TTL seconds; the post signals
+drop its copy at once, so this process's own writes show up immediately.
+
+The ETag covers the URL, the dark_mode cookie and, for logged-in users, the
+user snapshot, so per-user pages revalidate privately. Requests with pending
+flash messages bypass both layers; streamed responses and responses that
+set cookies are never stored.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from flask import g, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+from cache import MISSING, make_backend
+from queries import listing_version
+from signals import POST_LISTING_SIGNALS
+
+
+class CacheableEndpoint:
+    def __init__(self, version, on_hit=None, dynamic=True):
+        self.version = version
+        self.on_hit = on_hit
+        self.dynamic = dynamic
+
+
+class PageCache:
+    def __init__(self):
+        self.enabled = False
+        self._endpoints = {}
+        self._versions = {}  # category name (None for all) -> (expires_at, version)
+        self.backend = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', 60)
+        self.max_age = app.config.get('PAGE_CACHE_MAX_AGE', 60)
+        self.version_ttl = app.config.get('PAGE_CACHE_VERSION_TTL', 1)
+        self.backend = make_backend(
+            app.config.get('PAGE_CACHE_BACKEND', 'memory'),
+            app.config.get('PAGE_CACHE_MAX_ENTRIES', 500),
+            self.ttl,
+            app.config.get('PAGE_CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'page_cache.db'),
+        )
+        # Validators change with each deploy of the templates
+        self.templates_modified = _newest_mtime(os.path.join(app.root_path, app.template_folder))
+        self.salt = str(self.templates_modified.timestamp())
+
+        for signal in POST_LISTING_SIGNALS:
+            signal.connect(self._touch_listings, app)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def cacheable(self, endpoint, version, on_hit=None, dynamic=True):
+        """Register ``version(**view_args) -> (token, last_modified) | None`` for an endpoint.
+
+        Dynamic pages also show counters and rankings that change without a
+        new version, so their validators additionally roll over every TTL.
+        """
+        self._endpoints[endpoint] = CacheableEndpoint(version, on_hit, dynamic)
+
+    def listings_version(self, category_name=None):
+        now = time.monotonic()
+        entry = self._versions.get(category_name)
+        if entry is None or entry[0] <= now:
+            entry = self._versions[category_name] = (now + self.version_ttl, listing_version(category_name))
+        return entry[1]
+
+    def static_version(self):
+        return '', self.templates_modified
+
+    def _touch_listings(self, sender, **extra):
+        # Only a hint: the next request re-reads the version instead of waiting out the TTL
+        self._versions.clear()
+
+    def _before_request(self):
+        endpoint = self._endpoints.get(request.endpoint)
+        if not self.enabled or endpoint is None or request.method not in ('GET', 'HEAD'):
+            return None
+        if '_flashes' in session:
+            return None
+        version = endpoint.version(**request.view_args)
+        if version is None:
+            return None  # let the view produce its 404
+        token, last_modified = version
+        if endpoint.dynamic:
+            bucket = int(time.time() // self.ttl) * self.ttl
+            token = f'{token}:{bucket}'
+            last_modified = max(last_modified, datetime.utcfromtimestamp(bucket))
+
+        anonymous = not current_user.is_authenticated
+        viewer = 'anonymous' if anonymous else repr([getattr(current_user, f) for f in ('id', 'username', 'role',
+                                                                                       'profile_picture_variants')])
+        etag = hashlib.sha1('|'.join([
+            self.salt, request.full_path, token, request.cookies.get('dark_mode', ''), viewer,
+        ]).encode()).hexdigest()[:24]
+        g.page_cache = (etag, last_modified, anonymous)
+
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            if endpoint.on_hit:
+                endpoint.on_hit(**request.view_args)
+            return Response(status=304)
+        if anonymous:
+            cached = self.backend.get(f'page:{etag}')
+            if cached is not MISSING:
+                if endpoint.on_hit:
+                    endpoint.on_hit(**request.view_args)
+                body, mimetype = cached
+                response = Response(body, mimetype=mimetype)
+                response.headers['X-Page-Cache'] = 'hit'
+                return response
+        return None
+
+    def _after_request(self, response):
+        if 'page_cache' not in g:
+            return response
+        etag, last_modified, anonymous = g.pop('page_cache')
+        if response.status_code not in (200, 304):
+            return response
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.vary.add('Cookie')
+        if anonymous:
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+        else:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+
+        if (anonymous and response.status_code == 200 and 'X-Page-Cache' not in response.headers
+                and not session.modified and 'Set-Cookie' not in response.headers
+                and not response.direct_passthrough and not response.is_streamed):
+            self.backend.set(f'page:{etag}', (response.get_data(), response.mimetype), self.ttl)
+            response.headers['X-Page-Cache'] = 'miss'
+        return response
+
+    def info(self):
+        return self.backend.info()
+
+
+def _newest_mtime(folder):
+    newest = 0
+    for directory, _, files in os.walk(folder):
+        for name in files:
+            newest = max(newest, os.path.getmtime(os.path.join(directory, name)))
+    return datetime.utcfromtimestamp(int(newest))
+
+
+page_cache = PageCache()
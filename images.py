@@ -0,0 +1,184 @@
+"""Background image processing for uploads.
+
+``save_image()`` stores the original and hands it to ``pipeline``, which strips
+metadata and writes resized variants in modern formats from a worker pool.
+The variants are recorded on the owning row as JSON
+(``{"webp": {"400": "name-400w.webp", ...}, ...}``) and used to build srcsets.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = {
+    'posts': (96, 400, 800, 1200),
+    'profiles': (48, 96, 192),
+}
+FORMAT_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 80, 'method': 4},
+}
+# Preferred first; formats the installed Pillow cannot encode are skipped
+Image.init()
+FORMATS = tuple(fmt for fmt in ('avif', 'webp') if fmt.upper() in Image.SAVE)
+
+
+def variant_name(filename, width, fmt):
+    return f"{filename.rsplit('.', 1)[0]}-{width}w.{fmt}"
+
+
+def load_variants(value):
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        return {}
+
+
+def srcset(folder, variants, fmt=None):
+    fmt = fmt or next((fmt for fmt in FORMATS if fmt in variants), None)
+    if not fmt or fmt not in variants:
+        return ''
+    return ', '.join(f"/static/uploads/{folder}/{name} {width}w"
+                     for width, name in sorted(variants[fmt].items(), key=lambda item: int(item[0])))
+
+
+def closest_variant(variants, width):
+    # Smallest variant at least as wide as requested, else the largest one
+    for fmt in FORMATS:
+        sizes = sorted((int(w), name) for w, name in variants.get(fmt, {}).items())
+        if sizes:
+            return next((name for w, name in sizes if w >= width), sizes[-1][1])
+    return None
+
+
+def process_image(path, folder):
+    """Strip metadata from ``path`` and write its width variants next to it."""
+    directory, filename = os.path.split(path)
+    variants = {}
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        # Re-encode the original without EXIF/XMP (GIFs keep their frames untouched)
+        if not filename.lower().endswith('.gif'):
+            clean = image.copy()
+            clean.info = {}
+            if filename.lower().endswith(('.jpg', '.jpeg')):
+                clean.convert('RGB').save(path, quality=90, optimize=True)
+            else:
+                clean.save(path)
+
+        for width in VARIANT_WIDTHS[folder]:
+            if width > image.width and width != VARIANT_WIDTHS[folder][0]:
+                continue
+            resized = image
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            for fmt in FORMATS:
+                name = variant_name(filename, width, fmt)
+                resized.save(os.path.join(directory, name), fmt.upper(), **FORMAT_OPTIONS[fmt])
+                variants.setdefault(fmt, {})[str(width)] = name
+    return variants
+
+
+def remove_variants(folder_path, variants):
+    for names in variants.values():
+        for name in names.values():
+            try:
+                os.remove(os.path.join(folder_path, name))
+            except OSError:
+                pass  # File might not exist
+
+
+def _variant_columns(folder):
+    # Which model column records the variants of each upload folder
+    from models import User, Post
+    if folder == 'posts':
+        return Post, Post.featured_image, Post.image_variants
+    return User, User.profile_picture, User.profile_picture_variants
+
+
+class ImagePipeline:
+    def __init__(self):
+        self._app = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.max_workers = app.config.get('IMAGE_WORKERS', 2)
+        self.synchronous = app.config.get('IMAGE_PROCESSING_SYNC', False)
+
+        @app.cli.command('images-backfill')
+        @click.option('--force', is_flag=True, help='Reprocess uploads that already have variants.')
+        def images_backfill_command(force):
+            """Generate variants for existing uploads."""
+            count = self.backfill(force=force)
+            click.echo(f'Processed {count} images.')
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='image-pipeline')
+        return self._executor
+
+    def submit(self, folder, row_id, filename):
+        if self.synchronous:
+            return self._run(folder, row_id, filename)
+        return self._pool().submit(self._run, folder, row_id, filename)
+
+    def _run(self, folder, row_id, filename):
+        path = os.path.join(self._app.config['UPLOAD_FOLDER'], folder, filename)
+        try:
+            variants = process_image(path, folder)
+        except Exception as e:
+            print(f"Error processing image {path}: {e}")
+            return None
+        from models import db
+        model, file_column, variants_column = _variant_columns(folder)
+        with self._app.app_context():
+            # Only record the variants if the row still points at this upload
+            result = db.session.execute(
+                db.update(model)
+                .where(model.id == row_id, file_column == filename)
+                .values({variants_column: json.dumps(variants)})
+            )
+            db.session.commit()
+            if result.rowcount and folder == 'profiles':
+                from signals import user_updated
+                user_updated.send(self._app, user_id=row_id)
+        if result.rowcount == 0:
+            remove_variants(os.path.dirname(path), variants)
+        return variants
+
+    def backfill(self, force=False):
+        from models import db
+        jobs = []
+        for folder in VARIANT_WIDTHS:
+            model, file_column, variants_column = _variant_columns(folder)
+            query = db.select(model.id, file_column).where(file_column.isnot(None))
+            if folder == 'profiles':
+                query = query.where(file_column != 'default_profile.png')
+            if not force:
+                query = query.where(variants_column.is_(None))
+            for row_id, filename in db.session.execute(query):
+                if os.path.exists(os.path.join(self._app.config['UPLOAD_FOLDER'], folder, filename)):
+                    jobs.append((folder, row_id, filename))
+        results = list(self._pool().map(lambda job: self._run(*job), jobs))
+        return sum(1 for variants in results if variants)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+pipeline = ImagePipeline()
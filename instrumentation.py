@@ -0,0 +1,225 @@
+"""Opt-in per-request instrumentation.
+
+With INSTRUMENTATION_ENABLED on, every request records wall time, template
+render time, SQL statement count and SQL time per endpoint, along with the
+slowest statements seen. A fraction of requests (PROFILE_SAMPLE_RATE) also
+runs under cProfile. Aggregates are served from /admin/instrumentation and
+each request is written as a JSON line to a rotating log. With it off no
+hooks or engine listeners are installed at all.
+"""
+import cProfile
+import heapq
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import g, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+RECENT_TIMINGS = 500  # per endpoint, for percentiles
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.wall_ms = 0.0
+        self.max_wall_ms = 0.0
+        self.template_ms = 0.0
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.recent = deque(maxlen=RECENT_TIMINGS)
+
+    def add(self, record):
+        self.count += 1
+        self.errors += record['status'] >= 500
+        self.wall_ms += record['wall_ms']
+        self.max_wall_ms = max(self.max_wall_ms, record['wall_ms'])
+        self.template_ms += record['template_ms']
+        self.sql_count += record['sql_count']
+        self.sql_ms += record['sql_ms']
+        self.recent.append(record['wall_ms'])
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.wall_ms / self.count, 2),
+            'p50_ms': round(_percentile(recent, 0.50), 2),
+            'p95_ms': round(_percentile(recent, 0.95), 2),
+            'max_ms': round(self.max_wall_ms, 2),
+            'template_ms_mean': round(self.template_ms / self.count, 2),
+            'sql_per_request': round(self.sql_count / self.count, 2),
+            'sql_ms_mean': round(self.sql_ms / self.count, 2),
+        }
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self._endpoints = {}
+        self._slow_statements = []  # min-heap of (duration_ms, seq, entry)
+        self._profiles = deque(maxlen=20)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()  # cProfile can only run one profiler at a time
+        self._logger = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INSTRUMENTATION_ENABLED', False)
+        if not self.enabled:
+            return
+        self.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.slow_statement_limit = app.config.get('INSTRUMENTATION_SLOW_STATEMENTS', 20)
+        self.log_min_ms = app.config.get('INSTRUMENTATION_LOG_MIN_MS', 0)
+        self._logger = self._make_logger(app)
+
+        @app.before_request
+        def start_instrumentation():
+            g.instrumentation = {'started': time.perf_counter(), 'sql_count': 0, 'sql_ms': 0.0,
+                                 'template_ms': 0.0, 'template_depth': 0, 'statements': []}
+            if self.sample_rate and random.random() < self.sample_rate and self._profile_lock.acquire(False):
+                g.profiler = cProfile.Profile()
+                g.profiler.enable()
+
+        @app.after_request
+        def record_instrumentation(response):
+            if 'instrumentation' in g:
+                self._finish(response.status_code)
+            return response
+
+        @app.teardown_request
+        def stop_profiler(exc):
+            # Reached without after_request when the view raised
+            if 'profiler' in g:
+                self._stop_profiler()
+
+        with app.app_context():
+            from models import db
+            for engine in set(db.engines.values()):
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+                event.listen(engine, 'handle_error', self._handle_error)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+
+    def _make_logger(self, app):
+        path = app.config.get('INSTRUMENTATION_LOG_PATH') or os.path.join(app.instance_path, 'requests.log')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        logger = logging.getLogger('dailypulse.requests')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=app.config.get('INSTRUMENTATION_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                          backupCount=app.config.get('INSTRUMENTATION_LOG_BACKUPS', 5))
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        return logger
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instrumentation_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['instrumentation_started'].pop()
+        try:
+            stats = g.instrumentation
+        except (AttributeError, RuntimeError):
+            return  # background thread or CLI, outside any request
+        elapsed = (time.perf_counter() - started) * 1000
+        stats['sql_count'] += 1
+        stats['sql_ms'] += elapsed
+        stats['statements'].append((elapsed, statement))
+
+    def _handle_error(self, context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        started = context.connection.info.get('instrumentation_started') if context.connection else None
+        if started:
+            started.pop()
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = g.get('instrumentation')
+        if stats is not None:
+            if stats['template_depth'] == 0:
+                stats['template_started'] = time.perf_counter()
+            stats['template_depth'] += 1
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = g.get('instrumentation')
+        if stats is not None and stats['template_depth']:
+            stats['template_depth'] -= 1
+            if stats['template_depth'] == 0:
+                stats['template_ms'] += (time.perf_counter() - stats['template_started']) * 1000
+
+    def _stop_profiler(self):
+        profiler = g.pop('profiler')
+        profiler.disable()
+        self._profile_lock.release()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        return out.getvalue()
+
+    def _finish(self, status):
+        stats = g.pop('instrumentation')
+        record = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'endpoint': request.endpoint or 'unknown',
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'wall_ms': round((time.perf_counter() - stats['started']) * 1000, 2),
+            'template_ms': round(stats['template_ms'], 2),
+            'sql_count': stats['sql_count'],
+            'sql_ms': round(stats['sql_ms'], 2),
+        }
+        if 'profiler' in g:
+            record['profile'] = self._stop_profiler()
+
+        with self._lock:
+            self._endpoints.setdefault(record['endpoint'], EndpointStats()).add(record)
+            for elapsed, statement in stats['statements']:
+                self._seq += 1
+                entry = (elapsed, self._seq, {'endpoint': record['endpoint'], 'ms': round(elapsed, 2),
+                                              'sql': ' '.join(statement.split())[:1000]})
+                if len(self._slow_statements) < self.slow_statement_limit:
+                    heapq.heappush(self._slow_statements, entry)
+                elif elapsed > self._slow_statements[0][0]:
+                    heapq.heapreplace(self._slow_statements, entry)
+            if 'profile' in record:
+                self._profiles.append({key: record[key] for key in ('time', 'endpoint', 'path', 'wall_ms', 'profile')})
+
+        if record['wall_ms'] >= self.log_min_ms or 'profile' in record:
+            self._logger.info(json.dumps(record))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'profile_sample_rate': self.sample_rate,
+                'endpoints': {name: stats.as_dict() for name, stats in sorted(self._endpoints.items())},
+                'slowest_statements': [entry for _, _, entry in sorted(self._slow_statements, reverse=True)],
+                'profiles': list(self._profiles),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._slow_statements.clear()
+            self._profiles.clear()
+
+
+instrumentation = Instrumentation()
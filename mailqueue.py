@@ -0,0 +1,243 @@
+"""Persistent outbound mail queue.
+
+Requests only insert ``OutboundEmail`` rows; worker threads claim due rows in
+batches, send each batch over a single SMTP connection and retry failures with
+exponential backoff until MAIL_MAX_ATTEMPTS, after which the row is marked
+``dead`` for inspection.
+
+The workers start with the web process's first request (not under TESTING) and
+poll every MAIL_QUEUE_POLL_INTERVAL seconds, so rows queued by other processes
+(``flask newsletter-send``) or left over from before a restart are delivered
+too; ``wake()`` only shortens the wait for mail queued by this process.
+"""
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask_mail import Message
+
+from models import db, NewsletterSubscription, OutboundEmail
+
+# Errors after which the SMTP connection cannot be reused for the rest of the batch
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+def connection_lost(error):
+    # Every SMTPException is an OSError too; other SMTP errors (a refused recipient,
+    # a rejected message) are about one message and leave the connection usable
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def enqueue(recipients, subject, body, sender=None):
+    """Add one message per recipient to the session.
+
+    The caller commits and then calls ``mail_queue.wake()``.
+    """
+    if isinstance(recipients, str):
+        recipients = [recipients]
+    for recipient in recipients:
+        db.session.add(OutboundEmail(sender=sender, recipient=recipient, subject=subject, body=body))
+
+
+class MailQueue:
+    def __init__(self):
+        self._app = None
+        self._mail = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, mail):
+        self._app = app
+        self._mail = mail
+        self.workers = app.config.get('MAIL_QUEUE_WORKERS', 1)
+        self.batch_size = app.config.get('MAIL_QUEUE_BATCH_SIZE', 50)
+        self.poll_interval = app.config.get('MAIL_QUEUE_POLL_INTERVAL', 5)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', 5)
+        self.retry_delay = app.config.get('MAIL_RETRY_BASE_DELAY', 30)
+        self.claim_timeout = timedelta(seconds=app.config.get('MAIL_CLAIM_TIMEOUT', 600))
+        register_commands(app, self)
+
+        @app.before_request
+        def start_mail_workers():
+            self._ensure_workers()
+
+    def wake(self):
+        self._ensure_workers()
+        self._wakeup.set()
+
+    def _ensure_workers(self):
+        if self._app is None or self.workers <= 0 or self._app.testing:
+            return
+        if len(self._threads) >= self.workers and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'mail-queue-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self._app.app_context():
+                    sent = self.process_batch()
+            except Exception as e:
+                print(f"Mail queue error: {e}")
+                sent = 0
+            if not sent:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def claim_batch(self):
+        now = datetime.utcnow()
+        # Rows left in 'sending' by a crashed worker go back to the queue
+        db.session.execute(
+            db.update(OutboundEmail)
+            .where(OutboundEmail.status == 'sending', OutboundEmail.claimed_at < now - self.claim_timeout)
+            .values(status='pending', claim_token=None)
+        )
+        due = (db.select(OutboundEmail.id)
+               .where(OutboundEmail.status == 'pending', OutboundEmail.next_attempt_at <= now)
+               .order_by(OutboundEmail.next_attempt_at)
+               .limit(self.batch_size))
+        token = uuid.uuid4().hex
+        db.session.execute(
+            db.update(OutboundEmail)
+            .where(OutboundEmail.id.in_(due.scalar_subquery()), OutboundEmail.status == 'pending')
+            .values(status='sending', claim_token=token, claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return OutboundEmail.query.filter_by(claim_token=token, status='sending').all()
+
+    def process_batch(self):
+        batch = self.claim_batch()
+        if not batch:
+            return 0
+        sent = 0
+        default_sender = self._app.config['MAIL_DEFAULT_SENDER']
+        try:
+            with self._mail.connect() as conn:
+                for index, email in enumerate(batch):
+                    try:
+                        conn.send(Message(subject=email.subject, sender=email.sender or default_sender,
+                                          recipients=[email.recipient], body=email.body))
+                    except Exception as e:
+                        if not connection_lost(e):
+                            self._failed(email, e)
+                            continue
+                        for pending in batch[index:]:
+                            self._failed(pending, e)
+                        break
+                    else:
+                        email.status = 'sent'
+                        email.sent_at = datetime.utcnow()
+                        email.claim_token = None
+                        sent += 1
+        except Exception as e:
+            # Could not connect (or quit) at all: the unsent rest of the batch is retried
+            for email in batch:
+                if email.status == 'sending':
+                    self._failed(email, e)
+        db.session.commit()
+        return sent
+
+    def _failed(self, email, error):
+        email.attempts += 1
+        email.last_error = f'{type(error).__name__}: {error}'
+        email.claim_token = None
+        if email.attempts >= self.max_attempts:
+            email.status = 'dead'
+        else:
+            delay = self.retry_delay * 2 ** (email.attempts - 1)
+            email.status = 'pending'
+            email.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def drain(self):
+        """Send everything that is due in the calling thread."""
+        sent = 0
+        while True:
+            count = self.process_batch()
+            if not count and not self._has_due():
+                return sent
+            sent += count
+
+    def _has_due(self):
+        return db.session.query(
+            OutboundEmail.query.filter(OutboundEmail.status == 'pending',
+                                       OutboundEmail.next_attempt_at <= datetime.utcnow()).exists()
+        ).scalar()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def stream_active_subscribers(chunk_size):
+    # Keyset walk over the primary key so memory stays bounded by chunk_size
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(NewsletterSubscription.id, NewsletterSubscription.email)
+            .where(NewsletterSubscription.is_active == True, NewsletterSubscription.id > last_id)
+            .order_by(NewsletterSubscription.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield [email for _, email in rows]
+        last_id = rows[-1].id
+
+
+def register_commands(app, queue):
+    @app.cli.command('newsletter-send')
+    @click.option('--subject', required=True)
+    @click.option('--body-file', type=click.File('r'), required=True)
+    @click.option('--chunk-size', default=1000, show_default=True)
+    @click.option('--drain', is_flag=True, help='Also send the queued messages from this process.')
+    def newsletter_send_command(subject, body_file, chunk_size, drain):
+        """Queue a newsletter for every active subscriber."""
+        body = body_file.read()
+        queued = 0
+        start = time.perf_counter()
+        for emails in stream_active_subscribers(chunk_size):
+            db.session.execute(db.insert(OutboundEmail), [
+                {'recipient': email, 'subject': subject, 'body': body,
+                 'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.utcnow()}
+                for email in emails
+            ])
+            db.session.commit()
+            queued += len(emails)
+        elapsed = time.perf_counter() - start
+        click.echo(f'Queued {queued} messages in {elapsed:.1f}s.')
+        if drain:
+            start = time.perf_counter()
+            sent = queue.drain()
+            click.echo(f'Sent {sent} messages in {time.perf_counter() - start:.1f}s.')
+        else:
+            click.echo('The web workers send them in the background; '
+                       'run `flask mail-drain` to send them from this process instead.')
+
+    @app.cli.command('mail-drain')
+    def mail_drain_command():
+        """Send all due queued mail in this process and report throughput."""
+        start = time.perf_counter()
+        sent = queue.drain()
+        elapsed = time.perf_counter() - start
+        rate = sent / elapsed if elapsed else 0
+        click.echo(f'Sent {sent} messages in {elapsed:.2f}s ({rate:.1f} msg/s).')
+        counts = dict(db.session.execute(
+            db.select(OutboundEmail.status, db.func.count()).group_by(OutboundEmail.status)).all())
+        click.echo(', '.join(f'{status}: {count}' for status, count in sorted(counts.items())))
+
+
+mail_queue = MailQueue()
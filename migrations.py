@@ -0,0 +1,232 @@
+"""Versioned schema migrations.
+
+``db.create_all()`` only creates missing tables, so changes to existing
+tables (new columns, new indexes) are listed here as numbered steps. The
+applied version is kept in ``schema_version``; ``upgrade()`` first creates any
+missing tables from the models and then runs the pending steps in order, each
+in its own transaction. Steps are written to be safe on databases that
+create_all() just built with the current models.
+"""
+import re
+import threading
+
+import click
+from sqlalchemy import inspect, text
+
+from models import db, User, Post, Category
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda step: step[0])
+        return func
+    return register
+
+
+def add_column(conn, table, name, ddl):
+    if name not in {column['name'] for column in inspect(conn).get_columns(table)}:
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {name} {ddl}'))
+
+
+def create_index(conn, name, table, *columns):
+    # IF NOT EXISTS: expression indexes do not show up in reflected index lists
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(columns)})'))
+
+
+@migration(1, 'Add image variant columns')
+def add_image_variant_columns(conn):
+    add_column(conn, 'post', 'image_variants', 'TEXT')
+    add_column(conn, 'user', 'profile_picture_variants', 'TEXT')
+
+
+@migration(2, 'Add composite indexes for listing and comment queries')
+def add_listing_indexes(conn):
+    create_index(conn, 'ix_post_published_created', 'post', 'is_published', 'created_at')
+    create_index(conn, 'ix_post_featured_published_created', 'post', 'is_featured', 'is_published', 'created_at')
+    create_index(conn, 'ix_post_category_published_created', 'post', 'category_id', 'is_published', 'created_at')
+    create_index(conn, 'ix_post_author_created', 'post', 'author_id', 'created_at')
+    create_index(conn, 'ix_comment_post_created', 'comment', 'post_id', 'created_at')
+
+
+@migration(3, 'Add derived post body columns')
+def add_derived_content_columns(conn):
+    from content import backfill
+    add_column(conn, 'post', 'content_html', 'TEXT')
+    add_column(conn, 'post', 'excerpt', 'VARCHAR(320)')
+    add_column(conn, 'post', 'word_count', 'INTEGER DEFAULT 0')
+    add_column(conn, 'post', 'reading_time', 'INTEGER DEFAULT 1')
+    backfill(conn)
+
+
+@migration(4, 'Add denormalized post comment counts')
+def add_comment_count_column(conn):
+    from queries import recount_comments
+    add_column(conn, 'post', 'comment_count', 'INTEGER NOT NULL DEFAULT 0')
+    recount_comments(conn)
+
+
+@migration(5, 'Backfill dashboard statistics')
+def backfill_dashboard_stats(conn):
+    from analytics import rebuild
+    rebuild(conn)
+
+
+@migration(6, 'Backfill trending scores and related posts')
+def backfill_rankings(conn):
+    # refresh_trending only rescores existing rows, so an upgraded database starts with none
+    from rankings import rebuild
+    if conn.execute(text("SELECT 1 FROM post_ranking LIMIT 1")).first() is None:
+        rebuild(conn)
+
+
+@migration(7, 'Add indexes for the listing validators')
+def add_listing_version_indexes(conn):
+    create_index(conn, 'ix_post_published_modified', 'post', 'is_published', 'coalesce(updated_at, created_at)')
+    create_index(conn, 'ix_post_category_published_modified', 'post',
+                 'category_id', 'is_published', 'coalesce(updated_at, created_at)')
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+    ))
+
+
+def current_version():
+    with db.engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(target=None):
+    db.create_all()
+    applied = []
+    version = current_version()
+    for step, description, func in MIGRATIONS:
+        if step <= version or (target is not None and step > target):
+            continue
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(text(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, CURRENT_TIMESTAMP)"
+            ), {'v': step, 'd': description})
+        applied.append((step, description))
+    return applied
+
+
+# EXPLAIN check: run each route through the test client, capture the SELECTs
+# it issues and ask SQLite for their plans. A full scan of a hot table means a
+# query shape is missing its index; a temporary sort is only a warning, since
+# after an index search it usually sorts a handful of rows. Plans depend on
+# table sizes, so run it against a seeded database.
+
+INDEXED_TABLES = ('post', 'comment', 'post_ranking', 'related_post', 'outbound_email', 'author_stats',
+                  'daily_stats')
+_scan_re = re.compile(r'^SCAN (\w+)\b(?! USING)')
+
+
+def plan_problems(plan):
+    problems = []
+    for detail in plan:
+        match = _scan_re.match(detail)
+        if match and match.group(1) in INDEXED_TABLES:
+            problems.append(detail)
+    return problems
+
+
+def plan_warnings(plan):
+    return [detail for detail in plan if 'USE TEMP B-TREE' in detail]
+
+
+def explain_routes(app):
+    from sqlalchemy import event
+    from counters import counters
+
+    post = Post.query.filter_by(is_published=True).order_by(Post.id.desc()).first()
+    category = Category.query.first()
+    author = User.query.filter(User.role.in_(['author', 'admin'])).first()
+    urls = [('index', '/')]
+    if post:
+        urls.append(('post_detail', f'/post/{post.id}'))
+        urls.append(('api_post_comments', f'/api/post/{post.id}/comments'))
+        urls.append(('search', '/search?q=' + (post.title.split() or ['news'])[0]))
+    if category:
+        urls.append(('category_posts', f'/category/{category.name}'))
+    if author:
+        urls.append(('dashboard', '/dashboard'))
+        if author.role == 'admin':
+            urls.append(('review_queue', '/admin/review'))
+
+    captured = []
+    thread_id = threading.get_ident()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        # Background workers share the engine; only keep this thread's queries
+        if threading.get_ident() == thread_id and statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    if author:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(author.id)
+            session['_fresh'] = True
+
+    report = []
+    engines = set(db.engines.values())  # GET requests may read from the replica
+    for endpoint, url in urls:
+        captured.clear()
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            status = client.get(url).status_code
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', capture)
+        with db.engine.connect() as conn:
+            for statement, parameters in captured:
+                plan = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+                report.append({'endpoint': endpoint, 'url': url, 'status': status,
+                               'sql': ' '.join(statement.split()), 'plan': plan,
+                               'problems': plan_problems(plan), 'warnings': plan_warnings(plan)})
+    if post:
+        counters.discard(post.id)  # the check's own page view
+    return report
+
+
+def init_migrations(app):
+    @app.cli.command('db-upgrade')
+    @click.option('--target', type=int, help='Stop after this migration version.')
+    def db_upgrade_command(target):
+        """Create missing tables and apply pending schema migrations."""
+        applied = upgrade(target)
+        for step, description in applied:
+            click.echo(f'Applied {step}: {description}')
+        click.echo(f'Schema at version {current_version()}.')
+
+    @app.cli.command('db-version')
+    def db_version_command():
+        """Show the applied schema version."""
+        latest = MIGRATIONS[-1][0] if MIGRATIONS else 0
+        click.echo(f'Schema at version {current_version()} (latest {latest}).')
+
+    @app.cli.command('db-explain')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not only problems.')
+    def db_explain_command(verbose):
+        """Check that the route queries are served by indexes (SQLite only)."""
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException('EXPLAIN QUERY PLAN checks need an SQLite database.')
+        failures = 0
+        for entry in explain_routes(app):
+            if entry['problems'] or entry['warnings'] or verbose:
+                click.echo(f"[{entry['endpoint']}] {entry['sql']}")
+                for detail in entry['plan']:
+                    marker = '!!' if detail in entry['problems'] else '~ ' if detail in entry['warnings'] else '  '
+                    click.echo(f'  {marker} {detail}')
+            failures += bool(entry['problems'])
+        if failures:
+            raise click.ClickException(f'{failures} route queries are not fully served by an index.')
+        click.echo('All route queries use indexes.')
@@ -4,7 +4,12 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import os
 
-db = SQLAlchemy()
+from counters import counters
+from images import load_variants, srcset, closest_variant
+from content import derive
+from database import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -12,6 +17,7 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
     profile_picture = db.Column(db.String(200), default='default_profile.png')
+    profile_picture_variants = db.Column(db.Text)  # JSON written by the image pipeline
     bio = db.Column(db.Text, default='')
     role = db.Column(db.String(20), default='reader')  # reader, author, admin
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -25,11 +31,17 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
-    def get_profile_picture_url(self):
+    def get_profile_picture_url(self, size=None):
         if self.profile_picture and self.profile_picture != 'default_profile.png':
-            return f"/static/uploads/profiles/{self.profile_picture}"
+            variant = closest_variant(load_variants(self.profile_picture_variants), size) if size else None
+            return f"/static/uploads/profiles/{variant or self.profile_picture}"
         return "/static/images/default_profile.png"
 
+    def get_profile_picture_srcset(self):
+        if self.profile_picture and self.profile_picture != 'default_profile.png':
+            return srcset('profiles', load_variants(self.profile_picture_variants))
+        return ''
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -45,26 +57,84 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # Derived from content by set_content(); listings read these instead of the body
+    content_html = db.Column(db.Text)
+    excerpt = db.Column(db.String(320))
+    word_count = db.Column(db.Integer, default=0)
+    reading_time = db.Column(db.Integer, default=1)  # minutes
     featured_image = db.Column(db.String(200))
+    image_variants = db.Column(db.Text)  # JSON written by the image pipeline
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_published = db.Column(db.Boolean, default=False)
     is_featured = db.Column(db.Boolean, default=False)
     views = db.Column(db.Integer, default=0)
     likes = db.Column(db.Integer, default=0)
+    comment_count = db.Column(db.Integer, default=0, nullable=False)  # approved comments, kept by queries.add_comment
     
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan')
 
-    def get_featured_image_url(self):
+    # Listing access paths; created_at ties resolve by rowid, matching the (created_at, id) keyset order
+    __table_args__ = (
+        db.Index('ix_post_published_created', 'is_published', 'created_at'),
+        db.Index('ix_post_featured_published_created', 'is_featured', 'is_published', 'created_at'),
+        db.Index('ix_post_category_published_created', 'category_id', 'is_published', 'created_at'),
+        db.Index('ix_post_author_created', 'author_id', 'created_at'),
+        # Newest edit for the listing validators (queries.listing_version)
+        db.Index('ix_post_published_modified', is_published, db.func.coalesce(updated_at, created_at)),
+        db.Index('ix_post_category_published_modified', category_id, is_published,
+                 db.func.coalesce(updated_at, created_at)),
+    )
+
+    def set_content(self, content):
+        self.content = content
+        for field, value in derive(content).items():
+            setattr(self, field, value)
+
+    # Stored counts plus the deltas still waiting in the write-behind buffer
+    @property
+    def view_count(self):
+        return (self.views or 0) + counters.pending(self.id, 'views')
+
+    @property
+    def like_count(self):
+        return (self.likes or 0) + counters.pending(self.id, 'likes')
+
+    def get_featured_image_url(self, width=None):
         if self.featured_image:
-            return f"/static/uploads/posts/{self.featured_image}"
+            variant = closest_variant(load_variants(self.image_variants), width) if width else None
+            return f"/static/uploads/posts/{variant or self.featured_image}"
         return "https://picsum.photos/800/400?random=1"
 
+    def get_featured_image_srcset(self):
+        if self.featured_image:
+            return srcset('posts', load_variants(self.image_variants))
+        return ''
+
     def __repr__(self):
         return f'<Post {self.title}>'
 
+class PostRanking(db.Model):
+    # Precomputed by rankings.py; one row per published post
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    trending_score = db.Column(db.Float, default=0, nullable=False, index=True)
+    terms = db.Column(db.Text, default='')  # space-separated top terms used for related-post overlap
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PostRanking {self.post_id} {self.trending_score:.3f}>'
+
+class RelatedPost(db.Model):
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<RelatedPost {self.post_id} -> {self.related_id}>'
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -74,9 +144,59 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_comment_post_created', 'post_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Comment {self.content[:20]}...>'
 
+class SearchChange(db.Model):
+    # Posts the in-memory search index of every process must reload (search.py); post_id NULL means rebuild all
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<SearchChange {self.id} {self.post_id}>'
+
+class AuthorStats(db.Model):
+    # Running totals kept by analytics.py; author_id 0 holds the site-wide row
+    author_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    published = db.Column(db.Integer, default=0, nullable=False)
+    pending = db.Column(db.Integer, default=0, nullable=False)  # unpublished, waiting for review
+    views = db.Column(db.Integer, default=0, nullable=False)
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    comments = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<AuthorStats {self.author_id}>'
+
+class DailyStats(db.Model):
+    # Activity per author and UTC day, kept by analytics.py; author_id 0 is the whole site
+    author_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    posts = db.Column(db.Integer, default=0, nullable=False)  # created
+    published = db.Column(db.Integer, default=0, nullable=False)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    likes = db.Column(db.Integer, default=0, nullable=False)
+    comments = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<DailyStats {self.author_id} {self.day}>'
+
+class ImportCheckpoint(db.Model):
+    # Progress of a `flask bulk-import` run, committed together with each batch
+    source = db.Column(db.String(500), primary_key=True)  # kind:absolute path
+    fingerprint = db.Column(db.String(100), nullable=False)  # size:mtime of the input file
+    position = db.Column(db.Integer, default=0, nullable=False)  # records consumed
+    imported = db.Column(db.Integer, default=0, nullable=False)
+    skipped = db.Column(db.Integer, default=0, nullable=False)
+    completed = db.Column(db.Boolean, default=False, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.source} {self.position}>'
+
 class NewsletterSubscription(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -84,4 +204,26 @@ class NewsletterSubscription(db.Model):
     is_active = db.Column(db.Boolean, default=True)
 
     def __repr__(self):
-        return f'<NewsletterSubscription {self.email}>'
\ No newline at end of file
+        return f'<NewsletterSubscription {self.email}>'
+
+class OutboundEmail(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(120))
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_outbound_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<OutboundEmail {self.recipient} {self.status}>'
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Keyset (cursor) pagination.
+
+Listings are ordered by a tuple of key columns, newest first, and a page is
+addressed by the key of the row next to it rather than an OFFSET, so fetching
+page 500 costs the same index range scan as page 1. Cursors are opaque,
+URL-safe tokens wrapping the key values.
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import literal, tuple_
+
+
+def encode_cursor(values):
+    payload = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(payload, list):
+            abort(400)
+        return tuple(datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+                     for value in payload)
+    except (ValueError, TypeError, KeyError):
+        abort(400)
+
+
+def check_cursor(values, types):
+    """Match decoded cursor ``values`` to the key's Python ``types``; anything else is a 400.
+
+    Cursors come from the query string, so a wrong length or value type must
+    not reach the database. Datetimes may also be plain ISO strings and
+    floats may be ints.
+    """
+    if values is None:
+        return None
+    if len(values) != len(types):
+        abort(400)
+    checked = []
+    for value, kind in zip(values, types):
+        if kind is datetime and isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value)
+            except ValueError:
+                abort(400)
+        elif kind is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if isinstance(value, bool) or not isinstance(value, kind):
+            abort(400)
+        checked.append(value)
+    return tuple(checked)
+
+
+class KeysetPage:
+    def __init__(self, items, keys, per_page, has_next, has_prev):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self.next_cursor = encode_cursor(keys[-1]) if has_next and keys else None
+        self.prev_cursor = encode_cursor(keys[0]) if has_prev and keys else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def page_from_keys(rows, key, per_page, after=None, before=None):
+    """Build a page from rows fetched in walk order (``per_page + 1`` of them).
+
+    ``rows`` come back reversed when walking backwards from a ``before`` cursor.
+    """
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, after is not None
+    return KeysetPage(rows, [key(row) for row in rows], per_page, has_next, has_prev)
+
+
+def paginate_keyset(query, columns, after=None, before=None, per_page=None):
+    """Paginate ``query`` ordered by ``columns`` descending."""
+    per_page = per_page or current_app.config['POSTS_PER_PAGE']
+    types = [column.type.python_type for column in columns]
+    after, before = check_cursor(after, types), check_cursor(before, types)
+    key = tuple_(*columns)
+
+    def bound(values):
+        # Bind with the column types so datetimes are stored-format compatible
+        return tuple_(*[literal(value, column.type) for value, column in zip(values, columns)])
+
+    if before is not None:
+        query = query.filter(key > bound(before)).order_by(*[column.asc() for column in columns])
+    else:
+        if after is not None:
+            query = query.filter(key < bound(after))
+        query = query.order_by(*[column.desc() for column in columns])
+    rows = query.limit(per_page + 1).all()
+    names = [column.key for column in columns]
+    return page_from_keys(rows, lambda row: [getattr(row, name) for name in names], per_page, after, before)
+
+
+def page_args(default_per_page=None):
+    """Read ``after``/``before``/``per_page`` from the query string."""
+    per_page = (request.args.get('per_page', type=int) or default_per_page
+                or current_app.config['POSTS_PER_PAGE'])
+    per_page = max(1, min(per_page, current_app.config['MAX_POSTS_PER_PAGE']))
+    return {
+        'after': decode_cursor(request.args.get('after')),
+        'before': decode_cursor(request.args.get('before')),
+        'per_page': per_page,
+    }
+
+
+def page_urls(endpoint, page, **values):
+    # Keep the rest of the query string (per_page, filters) on the cursor links
+    values = {**{key: value for key, value in request.args.items() if key not in ('after', 'before')}, **values}
+    return {
+        'next_url': url_for(endpoint, after=page.next_cursor, **values) if page.next_cursor else None,
+        'prev_url': url_for(endpoint, before=page.prev_cursor, **values) if page.prev_cursor else None,
+    }
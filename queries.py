@@ -0,0 +1,208 @@
+"""Named queries for the listing pages.
+
+Every listing eager-loads the relationships its template touches (category and
+author names on cards, the commenter on comments) and loads only the columns
+the cards render, so a page costs a fixed number of statements no matter how
+many rows it shows.
+"""
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import defer, joinedload, load_only
+
+from models import db, User, Post, Category, Comment, PostRanking, RelatedPost
+import analytics
+
+CARD_COLUMNS = (
+    Post.id, Post.title, Post.excerpt, Post.reading_time, Post.featured_image, Post.image_variants,
+    Post.created_at,
+    Post.is_published, Post.is_featured, Post.views, Post.likes,
+    Post.author_id, Post.category_id,
+)
+
+
+def _cards(query):
+    return query.options(
+        load_only(*CARD_COLUMNS),
+        joinedload(Post.category).load_only(Category.name),
+        joinedload(Post.author).load_only(User.username, User.role),
+    )
+
+
+def published_posts():
+    return _cards(Post.query.filter_by(is_published=True))
+
+
+def featured_posts(limit=3):
+    return published_posts().filter_by(is_featured=True).order_by(Post.created_at.desc()).limit(limit).all()
+
+
+def latest_posts(limit=9):
+    return published_posts().order_by(Post.created_at.desc()).limit(limit).all()
+
+
+def trending_posts(limit=6):
+    # Scores are precomputed and decayed by rankings.py
+    return (published_posts()
+            .join(PostRanking, PostRanking.post_id == Post.id)
+            .order_by(PostRanking.trending_score.desc())
+            .limit(limit)
+            .all())
+
+
+# Paginated listings are returned unordered; pagination.paginate_keyset
+# orders them by LISTING_KEY.
+LISTING_KEY = (Post.created_at, Post.id)
+
+
+def category_posts(category_id):
+    return published_posts().filter_by(category_id=category_id)
+
+
+def author_posts(author_id):
+    return _cards(Post.query.filter_by(author_id=author_id))
+
+
+def pending_posts():
+    # Admin review queue, along ix_post_published_created
+    return _cards(Post.query.filter_by(is_published=False))
+
+
+def posts_by_ids(ids):
+    # Keeps the order of ``ids`` (e.g. search relevance)
+    if not ids:
+        return []
+    posts = {post.id: post for post in published_posts().filter(Post.id.in_(ids))}
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def related_posts(post, limit=3):
+    return (published_posts()
+            .join(RelatedPost, RelatedPost.related_id == Post.id)
+            .filter(RelatedPost.post_id == post.id)
+            .order_by(RelatedPost.score.desc())
+            .limit(limit)
+            .all())
+
+
+def post_detail(post_id):
+    # The page renders content_html; the raw body is only needed by the editor
+    return (Post.query
+            .options(defer(Post.content),
+                     joinedload(Post.category), joinedload(Post.author).load_only(User.username, User.role))
+            .filter_by(id=post_id)
+            .first_or_404())
+
+
+def listing_version(category_name=None):
+    """Validators for post listings and feeds, read from the post table itself.
+
+    The newest change (edit or creation) and the number of published posts,
+    in the category when given, move with every write, whichever process,
+    import or SQL session made it. Both are answered from the
+    ``ix_post_*published_modified`` expression indexes.
+    """
+    condition = [Post.is_published == True]
+    if category_name is not None:
+        condition.append(Post.category_id == db.select(Category.id).where(Category.name == category_name)
+                         .scalar_subquery())
+    modified, count = db.session.execute(db.select(
+        db.select(db.func.max(db.func.coalesce(Post.updated_at, Post.created_at))).where(*condition)
+        .scalar_subquery(),
+        db.select(db.func.count()).select_from(Post).where(*condition).scalar_subquery(),
+    )).one()
+    modified = modified or datetime(1970, 1, 1)
+    return f'{modified.isoformat()}:{count}', modified
+
+
+def post_version(post_id):
+    # Validators for the post page: the post's last edit and its newest comment
+    row = db.session.execute(
+        db.select(db.func.coalesce(Post.updated_at, Post.created_at),
+                  db.select(db.func.max(Comment.created_at)).where(Comment.post_id == post_id).scalar_subquery())
+        .where(Post.id == post_id)
+    ).first()
+    if row is None:
+        return None
+    modified = max(value for value in row if value is not None)
+    return f'{row[0].isoformat()}:{row[1].isoformat() if row[1] else ""}', modified
+
+
+# Comments are paged newest first along ix_comment_post_created
+COMMENT_KEY = (Comment.created_at, Comment.id)
+
+
+def post_comments(post_id):
+    return (Comment.query
+            .options(joinedload(Comment.user).load_only(User.username, User.role))
+            .filter_by(post_id=post_id, is_approved=True))
+
+
+def add_comment(post_id, user_id, content):
+    """Insert a comment, bump the post's comment_count and the author's statistics in one transaction.
+
+    Returns ``(comment, comment_count)``, or None with nothing written when
+    the post does not exist.
+    """
+    row = db.session.execute(
+        db.update(Post).where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + 1, updated_at=Post.updated_at)  # not an edit
+        .returning(Post.comment_count, Post.author_id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        db.session.rollback()
+        return None
+    comment_count, author_id = row
+    analytics.apply(db.session, {author_id: {'comments': 1}}, {author_id: {'comments': 1}})
+    comment = Comment(content=content, user_id=user_id, post_id=post_id)
+    db.session.add(comment)
+    db.session.commit()
+    return comment, comment_count
+
+
+def recount_comments(conn):
+    """Recompute every post's comment_count from its approved comments."""
+    return conn.execute(db.text(
+        "UPDATE post SET comment_count = "
+        "(SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id AND comment.is_approved)"
+    )).rowcount
+
+
+def all_categories():
+    return Category.query.order_by(Category.name).all()
+
+
+# Statement counting for tests: with TESTING (or SQL_QUERY_BUDGET_ENFORCE) on,
+# a request that runs more statements than its endpoint budget fails loudly.
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+
+
+def init_query_budget(app):
+    event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    def enforcing():
+        return current_app.testing or current_app.config.get('SQL_QUERY_BUDGET_ENFORCE', False)
+
+    @app.before_request
+    def start_query_count():
+        if enforcing():
+            g.sql_statements = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        if 'sql_statements' in g:
+            budget = app.config.get('SQL_QUERY_BUDGETS', {}).get(request.endpoint)
+            if budget is not None and g.sql_statements > budget:
+                raise QueryBudgetExceeded(
+                    f'{request.endpoint} ran {g.sql_statements} SQL statements (budget {budget})')
+        return response
@@ -0,0 +1,252 @@
+"""Precomputed trending scores and related posts.
+
+``post_ranking`` holds one row per published post with a time-decayed
+trending score and the post's top terms; ``related_post`` holds each post's
+few most similar posts in its category (Jaccard overlap of top terms).
+
+Publishing or editing a post updates its own rows and offers the post to the
+related lists of recent posts in the same category, so the work per write is
+bounded by RELATED_CANDIDATES rather than the archive size. Trending scores
+decay with age, so a background thread refreshes them for posts inside the
+trending window; ``flask rankings-rebuild`` recomputes everything.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import click
+
+from models import db, Post, PostRanking, RelatedPost
+from search import tokenize
+from signals import post_created, post_updated, post_published
+
+TERMS_PER_POST = 20
+TITLE_TERM_WEIGHT = 3
+RELATED_LIMIT = 3
+RELATED_CANDIDATES = 200
+MAX_TERM_POSTS = 1000  # terms shared by more posts than this are too common to signal relatedness
+LIKE_WEIGHT = 3
+COMMENT_WEIGHT = 5
+GRAVITY = 1.5
+
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be because been but by can could did do does for from
+had has have he her his how i if in into is it its just more most my no not of on one or our out
+over she so some than that the their them then there these they this to up was we were what when
+which who will with would you your
+""".split())
+
+
+def extract_terms(title, content, limit=TERMS_PER_POST):
+    counts = Counter()
+    for weight, text in ((TITLE_TERM_WEIGHT, title), (1, content)):
+        for term in tokenize(text):
+            if len(term) > 2 and term not in STOPWORDS and not term.isdigit():
+                counts[term] += weight
+    return [term for term, _ in counts.most_common(limit)]
+
+
+def overlap(terms, other_terms):
+    if not terms or not other_terms:
+        return 0.0
+    return len(terms & other_terms) / len(terms | other_terms)
+
+
+def trending_score(views, likes, comments, created_at, now=None):
+    age_hours = max(((now or datetime.utcnow()) - created_at).total_seconds() / 3600, 0)
+    return ((views or 0) + LIKE_WEIGHT * (likes or 0) + COMMENT_WEIGHT * (comments or 0) + 1) / (age_hours + 2) ** GRAVITY
+
+
+def _set_related(post_id, scored):
+    db.session.execute(db.delete(RelatedPost).where(RelatedPost.post_id == post_id))
+    best = sorted(scored, key=lambda item: -item[1])[:RELATED_LIMIT]
+    if best:
+        db.session.execute(db.insert(RelatedPost), [
+            {'post_id': post_id, 'related_id': related_id, 'score': score} for related_id, score in best
+        ])
+
+
+def update_post(post):
+    """Recompute ``post``'s rankings and offer it to its neighbours' related lists."""
+    if not post.is_published:
+        remove_post(post.id)
+        db.session.commit()
+        return
+
+    terms = extract_terms(post.title, post.content)
+    term_set = set(terms)
+    ranking = db.session.get(PostRanking, post.id) or PostRanking(post_id=post.id)
+    ranking.category_id = post.category_id
+    ranking.terms = ' '.join(terms)
+    ranking.trending_score = trending_score(post.views, post.likes, post.comment_count, post.created_at)
+    ranking.computed_at = datetime.utcnow()
+    db.session.add(ranking)
+
+    # The post may have moved category or changed terms: drop it from every list first
+    db.session.execute(db.delete(RelatedPost).where(RelatedPost.related_id == post.id))
+
+    candidates = db.session.execute(
+        db.select(PostRanking.post_id, PostRanking.terms)
+        .join(Post, Post.id == PostRanking.post_id)
+        .where(PostRanking.category_id == post.category_id, PostRanking.post_id != post.id)
+        .order_by(Post.created_at.desc())
+        .limit(RELATED_CANDIDATES)
+    ).all()
+    scores = {candidate_id: overlap(term_set, set((candidate_terms or '').split()))
+              for candidate_id, candidate_terms in candidates}
+    _set_related(post.id, [(candidate_id, score) for candidate_id, score in scores.items() if score > 0])
+
+    current = defaultdict(list)
+    for row in RelatedPost.query.filter(RelatedPost.post_id.in_(list(scores))):
+        current[row.post_id].append((row.related_id, row.score))
+    for candidate_id, score in scores.items():
+        related = current[candidate_id]
+        if score > 0 and (len(related) < RELATED_LIMIT or score > min(s for _, s in related)):
+            _set_related(candidate_id, related + [(post.id, score)])
+    db.session.commit()
+
+
+def remove_post(post_id):
+    # Part of the caller's transaction, so it can run before the post row is deleted
+    db.session.execute(db.delete(RelatedPost).where(
+        (RelatedPost.post_id == post_id) | (RelatedPost.related_id == post_id)))
+    db.session.execute(db.delete(PostRanking).where(PostRanking.post_id == post_id))
+
+
+def rescore(conn, window_days=14, now=None):
+    """Recompute decayed trending scores for posts published inside the window.
+
+    ``conn`` is the caller's connection or session; nothing is committed.
+    """
+    now = now or datetime.utcnow()
+    since = now - timedelta(days=window_days)
+    rows = conn.execute(
+        db.select(Post.id, Post.views, Post.likes, Post.created_at, Post.comment_count)
+        .join(PostRanking, PostRanking.post_id == Post.id)
+        .where(Post.created_at >= since)
+    ).all()
+    if rows:
+        rankings = PostRanking.__table__
+        conn.execute(
+            rankings.update().where(rankings.c.post_id == db.bindparam('ranked_id'))
+            .values(trending_score=db.bindparam('score')),
+            [{'ranked_id': row.id,
+              'score': trending_score(row.views, row.likes, row.comment_count, row.created_at, now)}
+             for row in rows])
+    # Posts that left the window stop trending
+    conn.execute(
+        db.update(PostRanking)
+        .where(PostRanking.trending_score > 0,
+               PostRanking.post_id.in_(db.select(Post.id).where(Post.created_at < since)))
+        .values(trending_score=0)
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows)
+
+
+def refresh_trending(window_days=14, now=None):
+    count = rescore(db.session, window_days, now)
+    db.session.commit()
+    return count
+
+
+def rebuild(conn, window_days=14, batch_size=500):
+    """Recompute terms, related posts and trending scores for every published post.
+
+    ``conn`` is the caller's connection or session; nothing is committed.
+    """
+    conn.execute(db.delete(RelatedPost))
+    conn.execute(db.delete(PostRanking))
+    terms_by_post = {}
+    by_category = defaultdict(list)
+    query = (db.select(Post.id, Post.category_id, Post.title, Post.content)
+             .where(Post.is_published == True)
+             .execution_options(yield_per=batch_size))
+    batch = []
+    for row in conn.execute(query):
+        terms = extract_terms(row.title, row.content)
+        terms_by_post[row.id] = set(terms)
+        by_category[row.category_id].append(row.id)
+        batch.append({'post_id': row.id, 'category_id': row.category_id, 'terms': ' '.join(terms),
+                      'trending_score': 0, 'computed_at': datetime.utcnow()})
+        if len(batch) >= batch_size:
+            conn.execute(db.insert(PostRanking), batch)
+            batch = []
+    if batch:
+        conn.execute(db.insert(PostRanking), batch)
+
+    # Per category, find candidates through an inverted index instead of comparing every pair
+    for post_ids in by_category.values():
+        postings = defaultdict(list)
+        for post_id in post_ids:
+            for term in terms_by_post[post_id]:
+                postings[term].append(post_id)
+        related_rows = []
+        for post_id in post_ids:
+            candidates = set()
+            for term in terms_by_post[post_id]:
+                if len(postings[term]) <= MAX_TERM_POSTS:
+                    candidates.update(postings[term])
+            candidates.discard(post_id)
+            scored = sorted(((overlap(terms_by_post[post_id], terms_by_post[c]), c) for c in candidates), reverse=True)
+            related_rows.extend({'post_id': post_id, 'related_id': c, 'score': score}
+                                for score, c in scored[:RELATED_LIMIT] if score > 0)
+        if related_rows:
+            conn.execute(db.insert(RelatedPost), related_rows)
+    rescore(conn, window_days)
+    return len(terms_by_post)
+
+
+class TrendingRefresher:
+    def __init__(self):
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = app.config.get('TRENDING_REFRESH_INTERVAL', 300)
+        self.window_days = app.config.get('TRENDING_WINDOW_DAYS', 14)
+
+        for signal in (post_created, post_updated, post_published):
+            signal.connect(self._on_post_changed, app)
+
+        @app.before_request
+        def start_trending_refresher():
+            self.start()
+
+        @app.cli.command('rankings-rebuild')
+        def rankings_rebuild_command():
+            """Recompute trending scores and related posts for all published posts."""
+            started = time.perf_counter()
+            with db.engine.begin() as conn:
+                count = rebuild(conn, self.window_days)
+            click.echo(f'Ranked {count} posts in {time.perf_counter() - started:.1f}s.')
+
+    def _on_post_changed(self, sender, post, **extra):
+        try:
+            update_post(post)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Ranking update error: {e}")
+
+    def start(self):
+        if self._thread is not None or self.interval <= 0 or self._app.testing:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trending-refresh', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self._app.app_context():
+                    refresh_trending(self.window_days)
+            except Exception as e:
+                print(f"Trending refresh error: {e}")
+            time.sleep(self.interval)
+
+
+refresher = TrendingRefresher()
@@ -0,0 +1,315 @@
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+import click
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+
+from models import db, Post, SearchChange
+from pagination import check_cursor, page_from_keys
+
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+SEARCH_KEY_TYPES = (float, int)  # (rank, post id)
+REBUILD_BATCH_SIZE = 500
+CHANGE_LOG_SIZE = 10000  # change rows kept for processes catching up
+
+_token_re = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(value):
+    return _token_re.findall((value or '').lower())
+
+
+def _empty_page(per_page):
+    return page_from_keys([], None, per_page)
+
+
+class Fts5SearchIndex:
+    """Inverted index kept in an SQLite FTS5 virtual table."""
+
+    name = 'fts5'
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            exists = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_search'"
+            )).first()
+            if not exists:
+                self.create()
+                self._index_all()
+                db.session.commit()
+            self._ready = True
+
+    def create(self):
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5("
+            "title, content, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+        # Persist the column weights so ORDER BY rank ranks title hits first
+        db.session.execute(text(
+            "INSERT INTO post_search(post_search, rank) VALUES ('rank', :rank)"
+        ), {'rank': f'bm25({TITLE_WEIGHT}, {CONTENT_WEIGHT})'})
+
+    def index_post(self, post):
+        self._ensure()
+        db.session.execute(text("DELETE FROM post_search WHERE rowid = :id"), {'id': post.id})
+        if post.is_published:
+            db.session.execute(text(
+                "INSERT INTO post_search(rowid, title, content) VALUES (:id, :title, :content)"
+            ), {'id': post.id, 'title': post.title, 'content': post.content})
+
+    def remove_post(self, post_id):
+        self._ensure()
+        db.session.execute(text("DELETE FROM post_search WHERE rowid = :id"), {'id': post_id})
+
+    def search(self, query, after=None, before=None, per_page=10):
+        terms = tokenize(query)
+        if not terms:
+            return _empty_page(per_page)
+        self._ensure()
+        params = {'match': ' '.join(f'"{term}"*' for term in terms), 'limit': per_page + 1}
+        sql = "SELECT rowid, rank FROM post_search WHERE post_search MATCH :match"
+        if before is not None:
+            sql += " AND (rank, rowid) < (:rank, :id) ORDER BY rank DESC, rowid DESC"
+            params.update(rank=before[0], id=before[1])
+        else:
+            if after is not None:
+                sql += " AND (rank, rowid) > (:rank, :id)"
+                params.update(rank=after[0], id=after[1])
+            sql += " ORDER BY rank, rowid"
+        rows = db.session.execute(text(sql + " LIMIT :limit"), params).all()
+        return page_from_keys([(row[0], row[1]) for row in rows], lambda hit: [hit[1], hit[0]],
+                              per_page, after, before)
+
+    def rebuild(self):
+        with self._lock:
+            db.session.execute(text("DROP TABLE IF EXISTS post_search"))
+            self.create()
+            count = self._index_all()
+            db.session.commit()
+            self._ready = True
+        return count
+
+    def _index_all(self):
+        count = 0
+        for post in _published_posts():
+            db.session.execute(text(
+                "INSERT INTO post_search(rowid, title, content) VALUES (:id, :title, :content)"
+            ), {'id': post.id, 'title': post.title, 'content': post.content})
+            count += 1
+        return count
+
+
+class MemorySearchIndex:
+    """Pure-Python inverted index for database backends without FTS5.
+
+    The index lives in process memory and is built from the database on first
+    use. Every write through index_post/remove_post also appends the post id
+    to the ``search_change`` table in the writer's transaction, and each
+    process replays the changes it has not seen before using its index, so
+    all workers converge on the database. ``rebuild()`` appends a marker that
+    makes every other process rebuild too. Posts written by other means (raw
+    SQL, bulk inserts) need ``flask search-rebuild``.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # term -> {post_id: weight}
+        self._doc_terms = {}  # post_id -> set of terms
+        self._terms = []  # sorted vocabulary for prefix lookups
+        self._ready = False
+        self._seen = 0  # last search_change id applied to this process's index
+        self._lock = threading.RLock()
+
+    def _ensure(self):
+        if not self._ready:
+            self._load()
+        else:
+            self._sync()
+
+    def _sync(self):
+        rows = db.session.execute(
+            db.select(SearchChange.id, SearchChange.post_id)
+            .where(SearchChange.id > self._seen).order_by(SearchChange.id)
+        ).all()
+        if not rows:
+            return
+        # A gap means the rows this process needed were pruned (or, on some databases, a
+        # rolled-back insert skipped an id); reloading everything is always correct
+        if rows[0].id != self._seen + 1 or any(row.post_id is None for row in rows):
+            self._load()
+            return
+        changed = {row.post_id for row in rows}
+        posts = {post.id: post for post in db.session.execute(
+            db.select(Post.id, Post.title, Post.content, Post.is_published).where(Post.id.in_(changed)))}
+        for post_id in changed:
+            self._remove(post_id)
+            post = posts.get(post_id)
+            if post is not None and post.is_published:
+                self._add(post.id, post.title, post.content)
+        self._seen = rows[-1].id
+
+    def _log_change(self, post_id):
+        change = SearchChange(post_id=post_id)
+        db.session.add(change)
+        db.session.flush()
+        if change.id % 1000 == 0:
+            db.session.execute(db.delete(SearchChange).where(SearchChange.id <= change.id - CHANGE_LOG_SIZE))
+
+    def _add(self, post_id, title, content):
+        weights = defaultdict(float)
+        for term in tokenize(title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(content):
+            weights[term] += CONTENT_WEIGHT
+        for term, weight in weights.items():
+            if term not in self._postings:
+                insort(self._terms, term)
+            self._postings[term][post_id] = weight
+        self._doc_terms[post_id] = set(weights)
+
+    def _remove(self, post_id):
+        for term in self._doc_terms.pop(post_id, ()):
+            postings = self._postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def index_post(self, post):
+        with self._lock:
+            self._ensure()
+            self._remove(post.id)
+            if post.is_published:
+                self._add(post.id, post.title, post.content)
+            self._log_change(post.id)
+
+    def remove_post(self, post_id):
+        with self._lock:
+            self._ensure()
+            self._remove(post_id)
+            self._log_change(post_id)
+
+    def _expand(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        end = start
+        while end < len(self._terms) and self._terms[end].startswith(prefix):
+            end += 1
+        return self._terms[start:end]
+
+    def search(self, query, after=None, before=None, per_page=10):
+        terms = tokenize(query)
+        if not terms:
+            return _empty_page(per_page)
+        with self._lock:
+            self._ensure()
+            total_docs = len(self._doc_terms) or 1
+            scores = None
+            for prefix in terms:
+                term_scores = defaultdict(float)
+                for term in self._expand(prefix):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for post_id, weight in postings.items():
+                        term_scores[post_id] += weight * idf
+                # Every query term has to match, like the FTS5 implicit AND
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {post_id: score + term_scores[post_id]
+                              for post_id, score in scores.items() if post_id in term_scores}
+                if not scores:
+                    break
+        # Same key shape as FTS5: ascending (rank, id) where a lower rank is better
+        ranked = sorted((-score, post_id) for post_id, score in scores.items())
+        if before is not None:
+            ranked = [hit for hit in reversed(ranked) if hit < tuple(before)]
+        elif after is not None:
+            ranked = [hit for hit in ranked if hit > tuple(after)]
+        hits = [(post_id, rank) for rank, post_id in ranked[:per_page + 1]]
+        return page_from_keys(hits, lambda hit: [hit[1], hit[0]], per_page, after, before)
+
+    def _load(self):
+        # Changes committed while loading are replayed by the next _sync
+        self._seen = db.session.execute(db.select(db.func.coalesce(db.func.max(SearchChange.id), 0))).scalar()
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._terms = []
+        for post in _published_posts():
+            self._add(post.id, post.title, post.content)
+        self._ready = True
+
+    def rebuild(self):
+        with self._lock:
+            self._log_change(None)  # logged first so this process's own load covers it
+            self._load()
+            db.session.commit()
+            return len(self._doc_terms)
+
+
+def _published_posts():
+    query = db.select(Post.id, Post.title, Post.content).where(Post.is_published.is_(True))
+    return db.session.execute(query.execution_options(yield_per=REBUILD_BATCH_SIZE))
+
+
+search_index = MemorySearchIndex()
+
+
+def index_post(post):
+    search_index.index_post(post)
+
+
+def remove_post(post_id):
+    search_index.remove_post(post_id)
+
+
+def search_posts(query, after=None, before=None, per_page=10):
+    return search_index.search(query, after=check_cursor(after, SEARCH_KEY_TYPES),
+                               before=check_cursor(before, SEARCH_KEY_TYPES), per_page=per_page)
+
+
+def fts5_available(engine):
+    # Not every SQLite build has FTS5; creating a throwaway temp table is the reliable check
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            conn.exec_driver_sql("DROP TABLE temp.fts5_probe")
+        return True
+    except DBAPIError:
+        return False
+
+
+def choose_backend(app):
+    backend = app.config.get('SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend
+    if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'sqlite':
+        return 'memory'
+    with app.app_context():
+        return 'fts5' if fts5_available(db.engine) else 'memory'
+
+
+def init_search(app):
+    global search_index
+    backend = choose_backend(app)
+    search_index = Fts5SearchIndex() if backend == 'fts5' else MemorySearchIndex()
+
+    @app.cli.command('search-rebuild')
+    def search_rebuild_command():
+        """Rebuild the full-text search index from the post table."""
+        count = search_index.rebuild()
+        click.echo(f'Indexed {count} published posts ({search_index.name} backend).')
@@ -0,0 +1,20 @@
+"""Application signals sent by the write routes after they commit.
+
+Subscribers (caches, indexes, precomputed tables) connect to these instead of
+being called from each route. Every signal is sent with the app as sender and
+the affected ``post`` (or ``user_id`` for user signals) as a keyword argument.
+"""
+from flask.signals import Namespace
+
+_signals = Namespace()
+
+post_created = _signals.signal('post-created')
+post_updated = _signals.signal('post-updated')
+post_published = _signals.signal('post-published')
+post_deleted = _signals.signal('post-deleted')
+
+# A user's profile fields or role changed
+user_updated = _signals.signal('user-updated')
+
+# Any change that alters what readers see in post listings
+POST_LISTING_SIGNALS = (post_created, post_updated, post_published, post_deleted)
@@ -140,4 +140,81 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
     });
-});
\ No newline at end of file
+});
+// Infinite scroll for paginated listings (category, search, dashboard)
+document.addEventListener('DOMContentLoaded', function() {
+    if (!('IntersectionObserver' in window)) return;
+    
+    document.querySelectorAll('[data-infinite-scroll]').forEach(container => {
+        if (!container.dataset.nextUrl) return;
+        
+        // The server-rendered pager is the no-JS fallback
+        const section = container.closest('section') || container.closest('.overflow-x-auto').parentElement;
+        const pager = section && section.querySelector('.listing-pager');
+        if (pager) pager.style.display = 'none';
+        
+        const sentinel = document.createElement('div');
+        sentinel.className = 'infinite-scroll-sentinel';
+        (container.tagName === 'TBODY' ? container.closest('table') : container).after(sentinel);
+        
+        let loading = false;
+        const observer = new IntersectionObserver(async entries => {
+            if (!entries[0].isIntersecting || loading || !container.dataset.nextUrl) return;
+            loading = true;
+            try {
+                const response = await fetch(container.dataset.nextUrl, {
+                    headers: { 'Accept': 'application/json' },
+                    credentials: 'same-origin'
+                });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                container.insertAdjacentHTML('beforeend', data.html);
+                container.dataset.nextUrl = data.next_url || '';
+                if (!data.next_url) observer.disconnect();
+            } catch (error) {
+                console.error('Error loading more posts:', error);
+                observer.disconnect();
+                if (pager) pager.style.display = '';
+            } finally {
+                loading = false;
+            }
+        }, { rootMargin: '400px' });
+        observer.observe(sentinel);
+    });
+});
+// Post comments through the JSON API instead of a full page reload
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-comment-form]').forEach(form => {
+        const section = form.closest('section');
+        const list = section.querySelector('.comments-list');
+        const count = section.querySelector('.comment-count');
+        
+        form.addEventListener('submit', async function(event) {
+            const textarea = form.querySelector('textarea[name="content"]');
+            if (!textarea.value.trim()) return;
+            event.preventDefault();
+            const button = form.querySelector('button[type="submit"]');
+            button.disabled = true;
+            try {
+                const response = await fetch(form.dataset.apiUrl, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+                    credentials: 'same-origin',
+                    body: JSON.stringify({ content: textarea.value })
+                });
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                const empty = list.querySelector('.comments-empty');
+                if (empty) empty.remove();
+                list.insertAdjacentHTML('afterbegin', data.html);
+                if (count) count.textContent = data.comment_count;
+                textarea.value = '';
+            } catch (error) {
+                console.error('Error posting comment:', error);
+                form.submit();
+            } finally {
+                button.disabled = false;
+            }
+        });
+    });
+});
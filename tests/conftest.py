@@ -0,0 +1,70 @@
+"""Shared fixtures: the application against a throwaway SQLite database.
+
+``app`` is created at import time from the environment, so the database URL
+is set before importing it. Each test gets freshly created tables and empty
+caches.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_DIR = tempfile.mkdtemp(prefix='daily-pulse-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'app.db')
+os.environ.setdefault('ASSETS_BUILD_ON_STARTUP', 'false')
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')  # fast logins; still rehash-free
+sys.path.insert(0, ROOT)
+
+from app import app as flask_app  # noqa: E402
+from cache import cache  # noqa: E402
+from counters import counters  # noqa: E402
+from http_cache import page_cache  # noqa: E402
+from models import db, User, Post, Category  # noqa: E402
+import search  # noqa: E402
+from user_cache import user_cache  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        counters.flush()  # views counted by the test, before their posts go
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE IF EXISTS post_search')
+    search.search_index = type(search.search_index)()
+    cache.clear()
+    page_cache.backend.clear()
+    page_cache._versions.clear()
+    user_cache.backend.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def author(app):
+    user = User(username='author', email='author@example.com', role='admin', password_hash=password_hash('secret'))
+    db.session.add_all([user, Category(name='Technology'), Category(name='Business')])
+    db.session.commit()
+    return user
+
+
+def password_hash(password):
+    return generate_password_hash(password, flask_app.config['PASSWORD_HASH_METHOD'])
+
+
+def make_post(author, title, category_id=1, published=True):
+    post = Post(title=title, author_id=author.id, category_id=category_id, is_published=published)
+    post.set_content(f'{title} body text')
+    db.session.add(post)
+    db.session.commit()
+    return post
@@ -0,0 +1,72 @@
+import threading
+
+from flask import Flask
+
+import pytest
+
+from auth import Auth, SlidingWindow, auth
+
+
+@pytest.fixture
+def throttle():
+    app = Flask(__name__)
+    app.config.update(AUTH_THROTTLE_IP_LIMIT=3, AUTH_THROTTLE_EMAIL_LIMIT=2, AUTH_HASH_WORKERS=0)
+    throttle = Auth()
+    throttle.init_app(app)
+    return throttle
+
+
+def test_successful_logins_do_not_use_up_the_ip(throttle):
+    for n in range(10):
+        assert throttle.throttled('10.0.0.1', f'user{n}@example.com') == 0
+        throttle.record_login('10.0.0.1', f'user{n}@example.com', True)
+    assert throttle.throttled('10.0.0.1', 'other@example.com') == 0
+
+
+def test_failures_count_against_ip_and_email(throttle):
+    throttle.record_login('10.0.0.1', 'a@example.com', False)
+    throttle.record_login('10.0.0.1', 'A@example.com', False)
+    assert throttle.throttled('10.0.0.2', 'a@example.com') > 0
+    assert throttle.throttled('10.0.0.1', 'b@example.com') == 0
+    throttle.record_login('10.0.0.1', 'b@example.com', False)
+    assert throttle.throttled('10.0.0.1', 'c@example.com') > 0
+    assert throttle.throttled('10.0.0.2', 'c@example.com') == 0
+
+
+def test_success_clears_the_email(throttle):
+    throttle.record_login('10.0.0.1', 'a@example.com', False)
+    throttle.record_login('10.0.0.2', 'a@example.com', True)
+    throttle.record_login('10.0.0.3', 'a@example.com', False)
+    assert throttle.throttled('10.0.0.4', 'a@example.com') == 0
+
+
+def test_registrations_count_against_the_ip(throttle):
+    for _ in range(3):
+        assert throttle.throttled('10.0.0.1', 'new@example.com') == 0
+        throttle.record_attempt('10.0.0.1')
+    assert throttle.throttled('10.0.0.1', 'new@example.com') > 0
+
+
+def test_flood_against_a_saturated_pool_is_throttled(client, author):
+    saved = auth._slots, auth.ip_window
+    auth._slots = threading.BoundedSemaphore(1)
+    auth._slots.acquire()  # every hash job is refused with AuthBusy
+    auth.ip_window = SlidingWindow(3, 300)
+    try:
+        codes = [client.post('/login', data={'email': f'user{n}@example.com', 'password': 'x'}).status_code
+                 for n in range(5)]
+    finally:
+        auth._slots, auth.ip_window = saved
+    assert codes == [503, 503, 503, 429, 429]
+
+
+def test_pool_workers_are_started_by_init_app():
+    app = Flask(__name__)
+    app.config.update(AUTH_HASH_WORKERS=1, AUTH_HASH_NICE=0)
+    pool = Auth()
+    pool.init_app(app)
+    try:
+        assert len(pool._executor._processes) == 1
+        assert pool.check_password(pool.hash_password('secret'), 'secret')
+    finally:
+        pool.shutdown()
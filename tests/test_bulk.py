@@ -0,0 +1,24 @@
+import json
+
+from bulk import import_records
+from conftest import make_post
+from models import Post
+
+
+def write_jsonl(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    return str(path)
+
+
+def test_imported_ids_are_kept_and_new_posts_follow_them(app, author, tmp_path):
+    path = write_jsonl(tmp_path / 'posts.jsonl', [
+        {'id': 10, 'title': 'Ten', 'content': 'x', 'category': 'Technology', 'author': 'author'},
+        {'id': 20, 'title': 'Twenty', 'content': 'x', 'category': 'Business', 'author': 'author'},
+        {'title': 'No id', 'content': 'x', 'category': 'Technology', 'author': 'author'},
+        {'id': 10, 'title': 'Taken', 'content': 'x', 'category': 'Technology', 'author': 'author'},
+        {'id': 30, 'title': 'Unknown author', 'content': 'x', 'category': 'Technology', 'author': 'nobody'},
+    ])
+    progress = import_records('posts', path, 'jsonl', batch_size=10)
+    assert (progress.rows, progress.skipped) == (3, 2)
+    assert {post.title: post.id for post in Post.query} == {'Ten': 10, 'Twenty': 20, 'No id': 21}
+    assert make_post(author, 'Written later').id == 22
@@ -0,0 +1,70 @@
+from flask import Flask, request
+
+import pytest
+
+from config import Config
+from database import PRIMARY_COOKIE, REPLICA, init_database
+from models import db, Category
+
+
+@pytest.fixture
+def routed(tmp_path):
+    """A bare app on two SQLite files that are never synced, so each answer shows where it was read."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "primary.db"}',
+        DATABASE_REPLICA_URL=f'sqlite:///{tmp_path / "replica.db"}',
+    )
+    init_database(app)
+
+    @app.route('/categories', methods=['GET', 'POST'])
+    def categories():
+        if request.method == 'POST':
+            db.session.add(Category(name=request.form['name']))
+            db.session.flush()
+        names = ','.join(sorted(name for name, in db.session.execute(db.select(Category.name))))
+        db.session.commit()
+        return names
+
+    with app.app_context():
+        for engine, name in ((db.engines[None], 'primary'), (db.engines[REPLICA], 'replica')):
+            db.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(db.insert(Category), {'name': name})
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    db.metadatas.pop(REPLICA)  # registered on the shared extension by init_app
+
+
+def names(app, bind_key=None):
+    with app.app_context():
+        with db.engines[bind_key].connect() as conn:
+            return {name for name, in conn.execute(db.select(Category.name))}
+
+
+def test_get_reads_from_the_replica(routed):
+    assert routed.test_client().get('/categories').text == 'replica'
+
+
+def test_writes_and_their_reads_use_the_primary(routed):
+    response = routed.test_client().post('/categories', data={'name': 'new'})
+    assert response.text == 'new,primary'
+    assert names(routed) == {'primary', 'new'}
+    assert names(routed, REPLICA) == {'replica'}
+
+
+def test_writer_is_pinned_to_the_primary(routed):
+    writer = routed.test_client()
+    response = writer.post('/categories', data={'name': 'new'})
+    assert PRIMARY_COOKIE in response.headers['Set-Cookie']
+    assert writer.get('/categories').text == 'new,primary'
+    assert routed.test_client().get('/categories').text == 'replica'
+
+
+def test_reads_outside_a_request_use_the_primary(routed):
+    with routed.app_context():
+        assert db.session.execute(db.select(Category.name)).scalar_one() == 'primary'
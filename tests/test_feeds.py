@@ -0,0 +1,19 @@
+from conftest import make_post
+
+
+def test_sitemap_chunks_past_the_last_id_are_not_found(app, client, author):
+    app.config['SITEMAP_CHUNK_SIZE'], chunk_size = 2, app.config['SITEMAP_CHUNK_SIZE']
+    try:
+        for n in range(3):
+            make_post(author, f'Post {n}')
+        index = client.get('/sitemap.xml', buffered=True).text
+        assert 'sitemap-posts-1.xml' in index and 'sitemap-posts-2.xml' not in index
+        assert b'/post/3' in client.get('/sitemap-posts-1.xml', buffered=True).data
+        assert client.get('/sitemap-posts-2.xml', buffered=True).status_code == 404
+    finally:
+        app.config['SITEMAP_CHUNK_SIZE'] = chunk_size
+
+
+def test_empty_site_has_one_empty_chunk(client, author):
+    assert client.get('/sitemap-posts-0.xml', buffered=True).status_code == 200
+    assert client.get('/sitemap-posts-1.xml', buffered=True).status_code == 404
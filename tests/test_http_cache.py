@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from conftest import make_post
+from http_cache import page_cache
+from models import db
+
+
+def insert_post_directly(title, category_id=1):
+    # Bypasses the routes and their signals, like another worker, an import or raw SQL
+    db.session.execute(db.text(
+        "INSERT INTO post (title, content, author_id, category_id, is_published, comment_count, created_at, updated_at) "
+        "VALUES (:title, 'body', 1, :category_id, 1, 0, :now, :now)"
+    ), {'title': title, 'category_id': category_id, 'now': datetime.utcnow()})
+    db.session.commit()
+
+
+def test_feed_etag_changes_after_direct_insert(client, author):
+    make_post(author, 'First')
+    response = client.get('/feed.xml', buffered=True)
+    etag = response.headers['ETag']
+    assert client.get('/feed.xml', headers={'If-None-Match': etag}, buffered=True).status_code == 304
+
+    page_cache._versions.clear()  # as if PAGE_CACHE_VERSION_TTL had passed
+    insert_post_directly('Written elsewhere')
+    response = client.get('/feed.xml', headers={'If-None-Match': etag}, buffered=True)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'Written elsewhere' in response.data
+
+
+def test_listing_version_reflects_deletes(app, author):
+    first = make_post(author, 'First')
+    make_post(author, 'Second')
+    before = page_cache.listings_version()
+    db.session.execute(db.text("DELETE FROM post WHERE id = :id"), {'id': first.id})
+    db.session.commit()
+    page_cache._versions.clear()
+    assert page_cache.listings_version()[0] != before[0]
+
+
+def test_signal_drops_the_memoized_version(client, author):
+    make_post(author, 'First')
+    etag = client.get('/sitemap.xml', buffered=True).headers['ETag']
+    client.post('/login', data={'email': 'author@example.com', 'password': 'secret'})
+    client.post('/create-post', data={'title': 'Via the route', 'content': 'text', 'category_id': 1})
+    client.get('/logout')
+    assert client.get('/sitemap.xml', headers={'If-None-Match': etag}, buffered=True).status_code == 200
+
+
+def test_category_feed_follows_its_own_category(client, author):
+    make_post(author, 'Tech', category_id=1)
+    make_post(author, 'Money', category_id=2)
+    technology = client.get('/category/Technology/feed.xml', buffered=True).headers['ETag']
+    business = client.get('/category/Business/feed.xml', buffered=True).headers['ETag']
+
+    page_cache._versions.clear()
+    insert_post_directly('More money', category_id=2)
+    assert client.get('/category/Technology/feed.xml', headers={'If-None-Match': technology},
+                      buffered=True).status_code == 304
+    response = client.get('/category/Business/feed.xml', headers={'If-None-Match': business}, buffered=True)
+    assert response.status_code == 200
+    assert b'More money' in response.data
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from instrumentation import Instrumentation
+
+
+def test_failed_statements_do_not_leak_start_times():
+    instrumentation = Instrumentation()
+    engine = create_engine('sqlite://')
+    event.listen(engine, 'before_cursor_execute', instrumentation._before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', instrumentation._after_cursor_execute)
+    event.listen(engine, 'handle_error', instrumentation._handle_error)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM missing'))
+        conn.execute(text('SELECT 1'))
+        assert conn.info['instrumentation_started'] == []
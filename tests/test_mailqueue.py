@@ -0,0 +1,155 @@
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from mailqueue import enqueue, mail_queue
+from models import db, OutboundEmail
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Accepts everything except RCPT TO an address in ``refused``; hangs up on one in ``drop``."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost sink')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'RCPT':
+                address = line.decode().split(':', 1)[1].strip().strip('<>')
+                if address in self.server.drop:
+                    return
+                if address in self.server.refused:
+                    self.reply('550 no such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 ok')
+            elif command == b'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                self.server.received.extend(recipients)
+                recipients = []
+                self.reply('250 queued')
+            elif command == b'RSET':
+                recipients = []
+                self.reply('250 ok')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.received = []
+        self.refused = set()
+        self.drop = set()
+
+
+@pytest.fixture
+def sink(app):
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state = app.extensions['mail']
+    saved = state.server, state.port, state.use_tls, state.use_ssl, state.suppress, mail_queue.max_attempts
+    state.server, state.port = server.server_address
+    state.use_tls = state.use_ssl = state.suppress = False
+    mail_queue.max_attempts = 3
+    yield server
+    state.server, state.port, state.use_tls, state.use_ssl, state.suppress, mail_queue.max_attempts = saved
+    server.shutdown()
+    server.server_close()
+
+
+def queue(*recipients):
+    enqueue(list(recipients), 'Hello', 'Body')
+    db.session.commit()
+
+
+def row(recipient):
+    return OutboundEmail.query.filter_by(recipient=recipient).one()
+
+
+def retry_delay(email):
+    return (email.next_attempt_at - datetime.utcnow()).total_seconds()
+
+
+def make_due(recipient):
+    row(recipient).next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_drain_sends_every_due_message(sink):
+    queue('a@example.com', 'b@example.com')
+    assert mail_queue.drain() == 2
+    assert sorted(sink.received) == ['a@example.com', 'b@example.com']
+    assert {email.status for email in OutboundEmail.query} == {'sent'}
+
+
+def test_refused_recipient_fails_only_its_message(sink):
+    sink.refused.add('bad@example.com')
+    queue('a@example.com', 'bad@example.com', 'c@example.com')
+    assert mail_queue.process_batch() == 2
+    assert sorted(sink.received) == ['a@example.com', 'c@example.com']
+    bad = row('bad@example.com')
+    assert (bad.status, bad.attempts) == ('pending', 1)
+    assert bad.last_error.startswith('SMTPRecipientsRefused')
+    assert row('c@example.com').attempts == 0
+
+
+def test_retries_back_off_exponentially(sink):
+    sink.refused.add('bad@example.com')
+    queue('bad@example.com')
+    mail_queue.process_batch()
+    first = retry_delay(row('bad@example.com'))
+    assert 0.8 * mail_queue.retry_delay - 1 <= first <= 1.2 * mail_queue.retry_delay
+    assert mail_queue.process_batch() == 0  # not due yet
+
+    make_due('bad@example.com')
+    mail_queue.process_batch()
+    second = retry_delay(row('bad@example.com'))
+    assert row('bad@example.com').attempts == 2
+    assert 1.6 * mail_queue.retry_delay - 1 <= second <= 2.4 * mail_queue.retry_delay
+
+
+def test_disconnect_aborts_the_rest_of_the_batch(sink):
+    sink.drop.add('drop@example.com')
+    queue('a@example.com', 'drop@example.com', 'c@example.com')
+    assert mail_queue.process_batch() == 1
+    assert sink.received == ['a@example.com']
+    for recipient in ('drop@example.com', 'c@example.com'):
+        email = row(recipient)
+        assert (email.status, email.attempts) == ('pending', 1)
+        assert email.last_error.startswith('SMTPServerDisconnected')
+
+    sink.drop.clear()
+    make_due('drop@example.com')
+    make_due('c@example.com')
+    assert mail_queue.drain() == 2
+
+
+def test_message_is_dead_lettered_after_max_attempts(sink):
+    sink.refused.add('bad@example.com')
+    queue('bad@example.com')
+    for _ in range(mail_queue.max_attempts):
+        make_due('bad@example.com')
+        mail_queue.process_batch()
+    bad = row('bad@example.com')
+    assert (bad.status, bad.attempts) == ('dead', mail_queue.max_attempts)
+    make_due('bad@example.com')
+    assert mail_queue.drain() == 0
@@ -0,0 +1,28 @@
+import pytest
+
+from conftest import make_post
+from migrations import backfill_rankings, plan_problems
+from models import db, PostRanking
+
+
+def test_plan_problems_flags_only_full_scans_of_indexed_tables():
+    assert plan_problems(['SCAN post']) == ['SCAN post']
+    assert plan_problems(['SCAN post USING INDEX ix_post_published_created']) == []
+    assert plan_problems(['SCAN post_ranking USING COVERING INDEX ix_post_ranking_trending_score']) == []
+    # 'comment' is listed; a longer name starting with it must not match on the prefix
+    assert plan_problems(['SCAN comments USING INDEX ix_comments']) == []
+    assert plan_problems(['SCAN category']) == []
+
+
+def test_ranking_backfill_is_part_of_the_step_transaction(app, author):
+    make_post(author, 'Ranked later')
+    with pytest.raises(RuntimeError):
+        with db.engine.begin() as conn:
+            backfill_rankings(conn)
+            assert conn.execute(db.select(db.func.count()).select_from(PostRanking)).scalar() == 1
+            raise RuntimeError('schema_version insert failed')
+    assert PostRanking.query.count() == 0
+
+    with db.engine.begin() as conn:
+        backfill_rankings(conn)
+    assert PostRanking.query.count() == 1
@@ -0,0 +1,85 @@
+import base64
+import json
+
+import pytest
+
+from conftest import make_post
+from pagination import encode_cursor
+
+
+def token(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.fixture
+def posts(author):
+    return [make_post(author, f'Post {n}') for n in range(5)]
+
+
+def titles(response):
+    return [post['title'] for post in response.get_json()['posts']]
+
+
+def listing(client, **args):
+    response = client.get('/api/category/Technology', query_string={'per_page': 2, **args})
+    assert response.status_code == 200
+    return response.get_json(), titles(response)
+
+
+def test_first_page_is_newest_first(client, posts):
+    page, shown = listing(client)
+    assert shown == ['Post 4', 'Post 3']
+    assert page['next_cursor'] and page['prev_cursor'] is None
+    assert 'per_page=2' in page['next_url']
+
+
+def test_next_and_previous_pages(client, posts):
+    first, _ = listing(client)
+    second, shown = listing(client, after=first['next_cursor'])
+    assert shown == ['Post 2', 'Post 1']
+    third, shown = listing(client, after=second['next_cursor'])
+    assert shown == ['Post 0']
+    assert third['next_cursor'] is None
+
+    back, shown = listing(client, before=third['prev_cursor'])
+    assert shown == ['Post 2', 'Post 1']
+    back, shown = listing(client, before=back['prev_cursor'])
+    assert shown == ['Post 4', 'Post 3']
+    assert back['prev_cursor'] is None
+
+
+def test_empty_pages(client, author):
+    page, shown = listing(client)
+    assert shown == [] and page['next_cursor'] is None and page['prev_cursor'] is None
+
+
+def test_cursor_past_the_end_is_an_empty_page(client, posts):
+    page, shown = listing(client, after=encode_cursor([posts[0].created_at, posts[0].id]))
+    assert shown == [] and page['next_cursor'] is None
+
+
+def test_plain_iso_datetime_is_accepted(client, posts):
+    _, shown = listing(client, after=token([posts[3].created_at.isoformat(), posts[3].id]))
+    assert shown == ['Post 2', 'Post 1']
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    token({'dt': '2024-01-01'}),  # not a list
+    token([1]),  # too short
+    token([{'dt': '2024-01-01T00:00:00'}, 1, 2]),  # too long
+    token(['x', 1]),  # not a datetime
+    token([{'dt': 'x'}, 1]),
+    token([{'dt': '2024-01-01T00:00:00'}, 'one']),  # not an id
+    token([{'dt': '2024-01-01T00:00:00'}, True]),
+    token([{'dt': '2024-01-01T00:00:00'}, 1.5]),
+])
+@pytest.mark.parametrize('direction', ['after', 'before'])
+def test_malformed_cursors_are_rejected(client, posts, cursor, direction):
+    assert client.get('/category/Technology', query_string={direction: cursor}).status_code == 400
+    assert client.get('/api/category/Technology', query_string={direction: cursor}).status_code == 400
+
+
+@pytest.mark.parametrize('cursor', [token([1]), token(['x', 1]), token([0.5, 'one'])])
+def test_malformed_search_cursors_are_rejected(client, posts, cursor):
+    assert client.get('/search', query_string={'q': 'post', 'after': cursor}).status_code == 400
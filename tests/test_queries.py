@@ -0,0 +1,65 @@
+import pytest
+
+import search
+from conftest import make_post, password_hash
+from models import db, User, Comment
+from queries import QueryBudgetExceeded, add_comment
+
+
+@pytest.fixture
+def site(author):
+    """A few authors with published, pending and commented posts in both categories."""
+    writers = [author]
+    for n in range(2):
+        writers.append(User(username=f'writer{n}', email=f'writer{n}@example.com', role='author',
+                            password_hash=password_hash('secret')))
+    reader = User(username='reader', email='reader@example.com', role='reader', password_hash=password_hash('secret'))
+    db.session.add_all(writers[1:] + [reader])
+    db.session.commit()
+
+    posts = []
+    for n in range(15):
+        post = make_post(writers[n % 3], f'Story number {n}', category_id=1 + n % 2, published=n % 5 != 0)
+        posts.append(post)
+    for n, post in enumerate(posts[:6]):
+        for m in range(3):
+            add_comment(post.id, writers[(n + m) % 3].id if m else reader.id, f'Comment {m} on {n}')
+    db.session.add(Comment(content='Hidden', user_id=reader.id, post_id=posts[1].id, is_approved=False))
+    db.session.commit()
+    search.search_index.rebuild()  # the posts above bypassed the routes that index them
+    return posts
+
+
+def login(client, email='author@example.com'):
+    assert client.post('/login', data={'email': email, 'password': 'secret'}).status_code == 302
+
+
+@pytest.mark.parametrize('url', [
+    '/', '/category/Technology', '/category/Business?per_page=3', '/search?q=story',
+    '/post/2', '/post/3', '/api/post/2/comments?per_page=1',
+])
+def test_public_listings_stay_within_budget(client, site, url):
+    # QueryBudgetExceeded propagates out of the test client under TESTING
+    assert client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize('url', ['/dashboard', '/admin/review', '/', '/post/2', '/api/dashboard'])
+def test_signed_in_listings_stay_within_budget(client, site, url):
+    login(client)
+    assert client.get(url).status_code == 200
+
+
+def test_adding_a_comment_stays_within_budget(client, site):
+    login(client, 'reader@example.com')
+    response = client.post('/api/post/2/comments', data={'content': 'Nice'})
+    assert response.status_code == 201
+
+
+def test_budget_is_enforced(app, client, site):
+    budgets = app.config['SQL_QUERY_BUDGETS']
+    app.config['SQL_QUERY_BUDGETS'] = {**budgets, 'category_posts': 1}
+    try:
+        with pytest.raises(QueryBudgetExceeded):
+            client.get('/category/Technology')
+    finally:
+        app.config['SQL_QUERY_BUDGETS'] = budgets
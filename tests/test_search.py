@@ -0,0 +1,65 @@
+import pytest
+
+import search
+from conftest import make_post
+from models import db, Post
+from pagination import decode_cursor
+
+
+@pytest.fixture(params=[search.Fts5SearchIndex, search.MemorySearchIndex], ids=['fts5', 'memory'])
+def index(request, author):
+    saved = search.search_index
+    search.search_index = request.param()
+    make_post(author, 'Apple harvest')  # title hits rank first
+    for n in range(6):
+        # Pairs of equal bodies, so equal ranks have to be ordered by id
+        make_post(author, f'Orchard notes {n}').set_content('An apple a day ' * (1 + n // 2))
+    make_post(author, 'Unrelated')
+    db.session.commit()
+    search.search_index.rebuild()
+    yield search.search_index
+    search.search_index = saved
+
+
+def walk(query, per_page, **cursor):
+    pages = []
+    page = search.search_posts(query, per_page=per_page, **cursor)
+    while True:
+        pages.append([post_id for post_id, _ in page.items])
+        if not page.next_cursor:
+            return pages, page
+        page = search.search_posts(query, per_page=per_page, after=decode_cursor(page.next_cursor))
+
+
+def test_pages_cover_every_hit_once_in_rank_order(index):
+    everything = search.search_posts('apple', per_page=50)
+    ranks = [rank for _, rank in everything.items]
+    assert len(everything) == 7 and ranks == sorted(ranks)
+    assert db.session.get(Post, everything.items[0][0]).title == 'Apple harvest'
+
+    pages, last = walk('apple', 3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == [post_id for post_id, _ in everything.items]
+
+    back = search.search_posts('apple', per_page=3, before=decode_cursor(last.prev_cursor))
+    assert [post_id for post_id, _ in back.items] == pages[1]
+    assert back.has_next and back.has_prev
+
+
+def test_prefix_terms_must_all_match(index):
+    assert len(search.search_posts('app orch')) == 6
+    assert len(search.search_posts('apple unrelated')) == 0
+    assert len(search.search_posts('')) == 0
+
+
+def test_auto_falls_back_to_memory_without_fts5(app, monkeypatch):
+    assert search.choose_backend(app) == 'fts5'  # this SQLite build has it
+    monkeypatch.setattr(search, 'fts5_available', lambda engine: False)
+    assert search.choose_backend(app) == 'memory'
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'fts5')
+    assert search.choose_backend(app) == 'fts5'
+
+
+def test_probe_leaves_nothing_behind(app):
+    assert search.fts5_available(db.engine)
+    assert search.fts5_available(db.engine)
@@ -0,0 +1,41 @@
+import pytest
+
+from cache import SQLiteCache
+from models import db, User
+from user_cache import user_cache
+
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+
+def role():
+    db.session.expire_all()
+    return User.query.filter_by(email='author@example.com').one().role
+
+
+def test_set_role_refuses_with_a_per_process_cache(runner, author):
+    result = runner.invoke(args=['user-set-role', 'author@example.com', 'reader'])
+    assert result.exit_code != 0
+    assert '--allow-stale' in result.output
+    assert role() == 'admin'
+
+
+def test_set_role_with_allow_stale(runner, author):
+    result = runner.invoke(args=['user-set-role', '--allow-stale', 'author@example.com', 'reader'])
+    assert result.exit_code == 0
+    assert 'restart' in result.output
+    assert role() == 'reader'
+
+
+def test_set_role_invalidates_a_shared_cache(runner, author, tmp_path):
+    saved = user_cache.backend
+    user_cache.backend = SQLiteCache(str(tmp_path / 'users.db'))
+    try:
+        assert user_cache.load(author.id).role == 'admin'
+        result = runner.invoke(args=['user-set-role', 'author@example.com', 'reader'])
+        assert result.exit_code == 0
+        assert user_cache.load(author.id).role == 'reader'
+    finally:
+        user_cache.backend = saved
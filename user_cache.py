@@ -0,0 +1,113 @@
+"""Identity cache for the Flask-Login user loader.
+
+``load_user()`` returns a ``UserSnapshot``: an immutable copy of the fields
+the templates and permission checks read (id, username, role, profile picture,
+bio), cached per user id with a TTL. Views that need the full row, such as
+the profile page, load the ``User`` by ``current_user.id``.
+
+Snapshots are dropped on ``user_updated``. The ``sqlite`` backend shares the
+cache between worker processes so an invalidation in one is seen by all.
+With the default ``memory`` backend every process keeps its own copy, and
+an invalidation only reaches the process that sent it: other web workers
+serve the old snapshot for up to USER_CACHE_TTL seconds. ``flask
+user-set-role`` runs in a process of its own, so it refuses to run against
+a per-process cache unless --allow-stale says that delay is acceptable.
+"""
+import os
+
+import click
+from flask_login import UserMixin
+
+from cache import LRUCache, MISSING, make_backend
+from models import db, User
+from signals import user_updated
+
+FIELDS = ('id', 'username', 'role', 'profile_picture', 'profile_picture_variants', 'bio')
+
+
+class UserSnapshot(UserMixin):
+    __slots__ = FIELDS
+
+    def __init__(self, *values):
+        for field, value in zip(FIELDS, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'UserSnapshot is read-only; load the User to change {name!r}')
+
+    # The display helpers only read snapshot fields
+    get_profile_picture_url = User.get_profile_picture_url
+    get_profile_picture_srcset = User.get_profile_picture_srcset
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+class UserCache:
+    def __init__(self):
+        self.backend = LRUCache()
+        self.ttl = 300
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_CACHE_TTL', 300)
+        self.backend = make_backend(
+            app.config.get('USER_CACHE_BACKEND', 'memory'),
+            app.config.get('USER_CACHE_MAX_ENTRIES', 10000),
+            self.ttl,
+            app.config.get('USER_CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'user_cache.db'),
+        )
+
+        user_updated.connect(self._on_user_updated, app)
+
+        @app.cli.command('user-set-role')
+        @click.argument('email')
+        @click.argument('role', type=click.Choice(['reader', 'author', 'admin']))
+        @click.option('--allow-stale', is_flag=True,
+                      help='Change the role even though running workers keep their cached copy for up to '
+                           'USER_CACHE_TTL seconds (memory backend).')
+        def user_set_role_command(email, role, allow_stale):
+            """Change a user's role."""
+            if self.per_process and not allow_stale:
+                raise click.ClickException(
+                    f'USER_CACHE_BACKEND=memory caches users per process; running web workers would keep '
+                    f'the old role for up to {self.ttl}s. Pass --allow-stale and restart the web workers '
+                    f'(or wait {self.ttl}s), or use the sqlite backend.')
+            user = User.query.filter_by(email=email).first()
+            if user is None:
+                raise click.ClickException(f'No user with email {email}.')
+            user.role = role
+            db.session.commit()
+            user_updated.send(app, user_id=user.id)
+            click.echo(f'{user.username} is now {role}.')
+            if self.per_process:
+                click.echo(f'Running web workers may use the old role for up to {self.ttl}s; '
+                           f'restart them to apply it now.')
+
+    @property
+    def per_process(self):
+        return isinstance(self.backend, LRUCache)
+
+    def load(self, user_id):
+        key = f'user:{user_id}'
+        # Cached as a plain tuple so every backend can store it
+        values = self.backend.get(key)
+        if values is MISSING:
+            row = db.session.execute(
+                db.select(*(getattr(User, field) for field in FIELDS)).where(User.id == user_id)).first()
+            if row is None:
+                return None
+            values = tuple(row)
+            self.backend.set(key, values, self.ttl)
+        return UserSnapshot(*values)
+
+    def invalidate(self, user_id):
+        self.backend.delete(f'user:{user_id}')
+
+    def _on_user_updated(self, sender, user_id, **extra):
+        self.invalidate(user_id)
+
+    def info(self):
+        return self.backend.info()
+
+
+user_cache = UserCache()